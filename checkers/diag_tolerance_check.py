@@ -27,7 +27,7 @@ yufiles    = ['YUPRHUMI','YUPRMASS']         # name of special output files to b
 ncomplines = [21,22]                         # max line to consider
 colpattern = ["xxcccccccccc","xxcccccccccc"] # coloumn pattern
 
-def check():
+def check(context=None):
 
     # init values
     err_count_identical=0
@@ -38,11 +38,12 @@ def check():
     header = myname+': '
 
     # get environment variables
-    verbose = int(os.environ['TS_VERBOSE'])
-    namelistdir =  dir_path(os.environ['TS_NAMELISTDIR'])
-    rundir = dir_path(os.environ['TS_RUNDIR'])
-    refoutdir = dir_path(os.environ['TS_REFOUTDIR'])
-    tolerance = os.environ['TS_TOLERANCE']
+    env = read_environ(context)
+    verbose = int(env['VERBOSE'])
+    namelistdir =  dir_path(env['NAMELISTDIR'])
+    rundir = dir_path(env['RUNDIR'])
+    refoutdir = dir_path(env['REFOUTDIR'])
+    tolerance = env['TOLERANCE']
 
 
     #get tolerance and minval
@@ -72,7 +73,7 @@ def check():
             if err !=0 : err_count=err
         except Exception as e:
             if verbose:
-                print e
+                print(e)
             return 20 # FAIL
 
     if err_count_identical == 0:
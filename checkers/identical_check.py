@@ -25,14 +25,14 @@ __maintainer__ = "xavier.lapillonne@meteoswiss.ch"
 # some global definitions
 yufile = 'YUPRTEST'   # name of special testsuite output
 
-def check():
+def check(context=None):
 
     # get name of myself
     myname = os.path.basename(__file__)
     header = myname+': '
 
     # get environment variables
-    env = read_environ()
+    env = read_environ(context)
     verbose = int(env['VERBOSE'])
     rundir = dir_path(env['RUNDIR'])
     refoutdir = dir_path(env['REFOUTDIR'])
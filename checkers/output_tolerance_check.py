@@ -28,14 +28,14 @@ yufile   = 'YUCHKDAT'    # name of special testsuite output
 yuswitch = 'lcheck'      # namelist switch controlling YUPRDBG output
 lnout    = 'ngribout'    # namelist entry which specifies the nr of output lists
 
-def check():
+def check(context=None):
 
     # get name of myself
     myname = os.path.basename(__file__)
     header = myname+': '
 
     # get environment variables
-    env = read_environ()
+    env = read_environ(context)
     verbose = int(env['VERBOSE'])
     rundir = dir_path(env['RUNDIR'])
     refoutdir = dir_path(env['REFOUTDIR'])
@@ -22,9 +22,9 @@ __author__      = "Santiago Moreno, Nicolo Lardelli, Oliver Fuhrer"
 __email__       = "cosmo-wg6@cosmo.org"
 __maintainer__  = "xavier.lapillonne@meteoswiss.ch"
 
-def run_checker():
+def check(context=None):
     # get environment variables
-    env = read_environ()
+    env = read_environ(context)
     verbose = int(env['VERBOSE'])
     rundir = env['RUNDIR']
     log_output = env['LOGFILE']
@@ -51,4 +51,4 @@ def run_checker():
     return cosmo_filechecker.check(logfile, verbose)
 
 if __name__ == "__main__":
-    sys.exit(run_checker())
+    sys.exit(check())
@@ -26,13 +26,13 @@ __maintainer__  = "xavier.lapillonne@meteoswiss.ch"
 # some global definitions
 yuswitch = 'ltestsuite' # namelist switch controlling YUPRTEST output
 
-def check():
+def check(context=None):
     # get name of myself
     myname = os.path.basename(__file__)
     header = myname+': '
 
     # get environment variables
-    env = read_environ()
+    env = read_environ(context)
     verbosity = int(env['VERBOSE'])
     rundir = dir_path(env['RUNDIR'])
     refoutdir = dir_path(env['REFOUTDIR'])
@@ -45,6 +45,7 @@ def check():
     reset_thresholds = str_to_bool(env['RESET_THRESHOLDS'])
     icon = str_to_bool(env['ICON'])
     yufile = env['YUFILE']
+    yucache = env['YUCACHE']
 
     # check if namelist file with switch exists in namelistdir
     switch_path = namelistdir + switch
@@ -89,7 +90,7 @@ def check():
             print(header + "  thresholds: " + tolerance_path)
 
     try:
-        c = Compare(yufile1, yufile2, thresh)
+        c = Compare(yufile1, yufile2, thresh, cachedir=yucache)
         if reset_thresholds:
             c.reset_thresholds()
         if tune_thresholds:
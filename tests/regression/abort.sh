@@ -0,0 +1,4 @@
+#!/bin/bash
+echo "Starting surrogate model"
+echo "*  PROGRAM TERMINATED BECAUSE OF ERRORS DETECTED"
+sleep 60
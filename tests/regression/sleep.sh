@@ -0,0 +1,3 @@
+#!/bin/bash
+echo "Starting surrogate model"
+sleep 137
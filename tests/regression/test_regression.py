@@ -2,8 +2,10 @@
 
 import os
 import shutil
+import signal
 import subprocess
 import tempfile
+import time
 
 import f90nml
 import pytest
@@ -541,6 +543,9 @@ def test_changepar_testcase():
     number_of_steps = 7
     timesteps = count_timesteps_in_stats_file(WORKDIR + '/basic/test_changepar/YUPRTEST')
     assert timesteps == list(range(number_of_steps + 1))
+    # parameters can also be addressed with the name of their namelist group
+    namelist = f90nml.read(WORKDIR + '/basic/test_changepar/INPUT_IO')
+    assert namelist['gribout']['lcheck'] is False
 
 
 def test_full_checker_list_testcase():
@@ -586,3 +591,156 @@ def test_restart_testcase():
 def test_full_testlist_from_xml():
     exit_status, stdout, stderr = run_testsuite()
     check_successful_run(exit_status, stdout, stderr)
+
+
+@pytest.mark.parametrize("argument_name", ['--jobs=', '-j '])
+def test_jobs_argument(argument_name):
+    exit_status, stdout, stderr = run_testsuite([argument_name + '4'])
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == 8
+    assert 'concurrent jobs' in stdout
+
+
+def test_cores_argument():
+    exit_status, stdout, stderr = run_testsuite(['--jobs=4', '--cores=32'])
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == 8
+    assert 'on 32 cores' in stdout
+
+
+@pytest.mark.parametrize("number_of_check_jobs", [0, 1, 3])
+def test_check_jobs_argument(number_of_check_jobs):
+    exit_status, stdout, stderr = run_testsuite(['--jobs=2',
+        '--check-jobs=' + str(number_of_check_jobs)])
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == 8
+
+
+@pytest.mark.parametrize("number_of_threads", [1, 8])
+def test_checker_threads_argument(number_of_threads):
+    exit_status, stdout, stderr = run_testsuite(['-v 2',
+        '--checker-threads=' + str(number_of_threads)])
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == 8
+    # checker output is printed in the order of the testlist
+    lines = extract_lines_with_pattern('_check.py', stdout).split('\n')
+    assert lines.index([l for l in lines if 'tolerance_check.py' in l][0]) > \
+        lines.index([l for l in lines if 'run_success_check.py' in l][0])
+
+
+def test_cache_argument():
+    exit_status, stdout, stderr = run_testsuite(['--cache=cache'])
+    check_successful_run(exit_status, stdout, stderr)
+    assert 'from cache' not in stdout
+    exit_status, stdout, stderr = run_testsuite(['--cache=cache', '-v 2'],
+        clean_before=False)
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == 8
+    assert number_of_lines_with_pattern('from cache', stdout) == 8
+
+
+def test_cache_argument_unwritable():
+    # the cache is optional, a cache which cannot be written is reported and not used
+    cachedir = os.path.join(ROOTDIR, 'testlist.xml')  # a file, not a directory
+    exit_status, stdout, stderr = run_testsuite(['--cache=' + cachedir])
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == 8
+    assert number_of_lines_with_pattern('Problem storing results', stdout) == 8
+
+
+@pytest.mark.parametrize("jobs_argument", ['', '--jobs=4'])
+def test_share_runs_argument(jobs_argument):
+    exit_status, stdout, stderr = run_testsuite(['--share-runs', '-v 2',
+        jobs_argument])
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == 8
+    # test_basic, test_derived and test_full share a single model run, test_identical
+    # runs the model itself since it checks reproducibility against test_basic
+    assert number_of_lines_with_pattern('Reusing results', stdout) == 2
+
+
+def test_jobs_skip_dependents():
+    # tests depending on a crashed test are skipped without running them
+    exit_status, stdout, stderr = run_testsuite(['--exe=echo.sh', '--force',
+        '--jobs=4', '-v 2'])
+    results = check_test_results(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == 8
+    assert results['crash'] == 3
+    assert results['skip'] == 4
+    assert 'Creating directory for test_restart' not in stdout
+
+
+@pytest.mark.parametrize("copy_argument", ['', '--copy-exe'])
+def test_copy_exe_argument(copy_argument):
+    exit_status, stdout, stderr = run_testsuite([copy_argument])
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == 8
+    executable = os.path.join(WORKDIR, 'basic/test_basic/model.py')
+    assert os.access(executable, os.X_OK)
+    if copy_argument:
+        assert os.stat(executable).st_nlink == 1
+    else:
+        assert os.path.isdir(os.path.join(WORKDIR, '.exe_store'))
+
+
+@pytest.mark.parametrize("selection,number_of_tests", [
+    (['--only=basic,test_[bd]*'], 2),
+    (['--only=basic,test_basic', '--only=basic,test_plain'], 2),
+    (["--match='^basic,test_(basic|derived|full)$'"], 3),
+    (['--checker=tolerance_check.py'], 4),
+    (['--changed=data/basic/test_basic/TOLERANCE', '--only=basic,test_[bd]*'], 2),
+    (['--changed=data/basic/test_plain/INPUT_ORG'], 1)])
+def test_selection_arguments(selection, number_of_tests):
+    exit_status, stdout, stderr = run_testsuite(selection)
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('RESULT', stdout) == number_of_tests
+
+
+def test_resources_argument():
+    exit_status, stdout, stderr = run_testsuite(['--resources=resources.csv', '-v 2'])
+    check_successful_run(exit_status, stdout, stderr)
+    assert number_of_lines_with_pattern('Resources: wall', stdout) == 8
+    assert 'Resources of the model runs' in stdout
+    with open(os.path.join(WORKDIR, 'resources.csv')) as f:
+        lines = f.read().splitlines()
+    assert lines[0].startswith('type,name,nprocs,result,wall')
+    assert len(lines) == 9
+
+
+def test_crash_pattern_abort():
+    # the model is aborted as soon as it prints a crash pattern instead of running until the timeout
+    start = time.time()
+    exit_status, stdout, stderr = run_testsuite(['--only=basic,test_plain',
+        '--exe=abort.sh', '--timeout=50', '-v 2'])
+    results = check_test_results(exit_status, stdout, stderr)
+    assert results['crash'] == 1
+    assert time.time() - start < 30
+    assert 'PROGRAM TERMINATED BECAUSE OF ERRORS DETECTED' in stdout
+    assert 'run_success_check.py' not in stdout
+
+
+@pytest.mark.parametrize("jobs_argument", ['', '--jobs=4'])
+def test_interrupt_kills_models(jobs_argument):
+    # the models of an interrupted testsuite are not left running
+    clean_working_directory()
+    cmd = 'exec ' + TESTSUITE_CMD + ' ' + ' '.join(DEFAULT_ARGUMENTS + ['--exe=sleep.sh', '--force', jobs_argument])
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, shell=True,
+        start_new_session=True)
+    time.sleep(5)
+    os.killpg(process.pid, signal.SIGINT)
+    assert process.wait() == 130
+    time.sleep(0.5)
+    models = subprocess.check_output(['ps', '-eo', 'args']).decode().split('\n')
+    assert 'sleep 137' not in models
+
+
+def test_yu_cache_argument():
+    exit_status, stdout, stderr = run_testsuite(['--only=basic,test_[bd]*'])
+    check_successful_run(exit_status, stdout, stderr)
+    # test_basic and test_derived use the same reference file
+    cachedir = os.path.join(WORKDIR, 'ts_yucache')
+    assert len(os.listdir(cachedir)) == 1
+    exit_status, stdout, stderr = run_testsuite(['--only=basic,test_[bd]*'],
+        clean_before=False)
+    check_successful_run(exit_status, stdout, stderr)
+    assert len(os.listdir(cachedir)) == 1
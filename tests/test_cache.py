@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import tempfile
+import threading
+import os, sys
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+from ts_cache import *
+
+class FakeTest(object):
+    def __init__(self, name, refoutdir=None, dependdir=None):
+        self.name = name
+        self.rundir = '/work/basic/' + name + '/'
+        self.refoutdir = refoutdir or ('/data/basic/' + name + '/')
+        self.dependdir = dependdir
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_store_restore(self):
+        rundir = os.path.join(self._dir.name, 'run')
+        os.makedirs(os.path.join(rundir, 'output'))
+        for name in ['exe.log', 'YUPRTEST', 'INPUT_ORG', 'output/lfff00000000']:
+            with open(os.path.join(rundir, name), 'w') as f:
+                f.write(name)
+        cache = ResultCache(os.path.join(self._dir.name, 'cache'))
+        self.assertFalse(cache.restore('abc', rundir))
+        cache.store('abc', rundir)
+        newdir = os.path.join(self._dir.name, 'new')
+        os.makedirs(newdir)
+        self.assertTrue(cache.restore('abc', newdir))
+        self.assertEqual(sorted(os.listdir(newdir)), ['YUPRTEST', 'exe.log', 'output'])
+        self.assertEqual(os.listdir(os.path.join(newdir, 'output')), ['lfff00000000'])
+
+    def test_store_error(self):
+        rundir = os.path.join(self._dir.name, 'run')
+        os.makedirs(rundir)
+        with open(os.path.join(rundir, 'exe.log'), 'w') as f:
+            f.write('exe.log')
+        os.symlink('missing', os.path.join(rundir, 'YUPRTEST'))  # cannot be copied
+        cache = ResultCache(os.path.join(self._dir.name, 'cache'))
+        os.makedirs(cache.directory)
+        self.assertRaises(OSError, cache.store, 'abc', rundir)
+        # no partially written entry is left behind
+        self.assertEqual(os.listdir(cache.directory), [])
+        self.assertFalse(cache.restore('abc', rundir))
+
+    def test_shared_runs(self):
+        runs = SharedRuns()
+        base = FakeTest('test_basic')
+        derived = FakeTest('test_derived')
+        self.assertEqual(runs.acquire('key', base), None)
+        runs.release('key', base, True)
+        self.assertIs(runs.acquire('key', derived), base)
+        runs.release('key', derived, True)
+        self.assertEqual(runs.acquire('other', FakeTest('test_other')), None)
+
+    def test_shared_runs_reference(self):
+        runs = SharedRuns()
+        base = FakeTest('test_basic')
+        derived = FakeTest('test_derived')
+        identical = FakeTest('test_identical', refoutdir='/work/basic/test_identical/../test_basic/',
+                             dependdir='../test_basic')
+        runs.acquire('key', derived)
+        runs.release('key', derived, True)
+        self.assertIs(runs.acquire('key', base), derived)
+        runs.release('key', base, True)
+        # test_identical checks reproducibility against test_basic, it has to run the model
+        self.assertEqual(runs.acquire('key', identical), None)
+
+    def test_shared_runs_wait(self):
+        runs = SharedRuns()
+        base = FakeTest('test_basic')
+        self.assertEqual(runs.acquire('key', base), None)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(runs.acquire('key', FakeTest('test_full'))))
+        thread.start()
+        runs.release('key', base, False)
+        thread.join()
+        # the run has failed, test_full has to run the model itself
+        self.assertEqual(result, [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import tempfile
+import threading
+import io
+import os, sys
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+import ts_checkers
+from ts_checkers import *
+
+CHECKER = """
+import sys
+def check(context=None):
+    print('rundir is ' + context['TS_RUNDIR'])
+    return int(context['TS_STATUS'])
+"""
+
+CRASHING_CHECKER = """
+def check(context=None):
+    raise RuntimeError('checker crashed')
+"""
+
+SHELL_CHECKER = """#!/bin/sh
+echo "rundir is $TS_RUNDIR"
+exit $TS_STATUS
+"""
+
+class Logger(object):
+    def debug(self, msg):
+        pass
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._checkerdir = ts_checkers.checkerdir
+        ts_checkers.checkerdir = self._dir.name
+        ts_checkers._modules.clear()
+        self._write('in_process_check.py', CHECKER)
+        self._write('crashing_check.py', CRASHING_CHECKER)
+        self._write('shell_check.sh', SHELL_CHECKER)
+        os.chmod(os.path.join(self._dir.name, 'shell_check.sh'), 0o755)
+
+    def tearDown(self):
+        ts_checkers.checkerdir = self._checkerdir
+        ts_checkers._modules.clear()
+        self._dir.cleanup()
+
+    def _write(self, name, text):
+        with open(os.path.join(self._dir.name, name), 'w') as f:
+            f.write(text)
+
+    def test_in_process(self):
+        self.assertNotEqual(load_checker('in_process_check.py'), None)
+        status, output = call_checker('in_process_check.py', {'TS_RUNDIR': '/tmp/run/', 'TS_STATUS': '10'}, Logger())
+        self.assertEqual(status, 10)
+        self.assertEqual(output, 'rundir is /tmp/run/\n')
+
+    def test_crash(self):
+        status, output = call_checker('crashing_check.py', {}, Logger())
+        self.assertEqual(status, 30)
+        self.assertIn('checker crashed', output)
+
+    def test_subprocess(self):
+        self.assertEqual(load_checker('shell_check.sh'), None)
+        status, output = call_checker('shell_check.sh', {'TS_RUNDIR': '/tmp/run/', 'TS_STATUS': '20'}, Logger())
+        self.assertEqual(status, 20)
+        self.assertEqual(output.strip(), 'rundir is /tmp/run/')
+
+    def test_thread_local_stdout(self):
+        stream = io.StringIO()
+        stdout = ThreadLocalStdout(stream)
+        outputs = {}
+        def run(name):
+            stdout.capture()
+            for i in range(100):
+                stdout.write(name)
+            outputs[name] = stdout.release()
+        threads = [threading.Thread(target=run, args=(name,)) for name in 'abcd']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stdout.write('main')
+        for name in 'abcd':
+            self.assertEqual(outputs[name], name * 100)
+        self.assertEqual(stream.getvalue(), 'main')
+
+
+if __name__ == "__main__":
+    unittest.main()
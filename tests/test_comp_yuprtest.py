@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import tempfile
+import io, contextlib
+import os, sys
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+from comp_yuprtest import *
+
+HEADER = """#  Experiment:  COSMO-Model
+#  ie_tot =   80   je_tot =   70   ke =   60
+#
+#    var    nt  lev                         min imin jmin                         max imax jmax                        mean
+"""
+
+def records(steps, factor=1.0):
+    lines = []
+    for step in steps:
+        for var in ['T', 'U']:
+            for lev in [1, 2]:
+                lines.append('%8s %5d %4d %25.17e %4d %4d %25.17e %4d %4d %25.17e\n' %
+                             (var, step, lev, 1.5 * lev, 3, 4, 2.5 * factor, 5, 6, 0.25 * step))
+    return ''.join(lines)
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _write(self, name, text):
+        filename = os.path.join(self._dir.name, name)
+        with open(filename, 'w') as f:
+            f.write(text)
+        return filename
+
+    def _cmp(self, *args):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            result = cmp_(*args)
+        return result, out.getvalue()
+
+    def test_lines(self):
+        lines = Lines(self._write('file', 'a\nb\nc\n'))
+        self.assertTrue(lines.has(2))
+        self.assertFalse(lines.has(3))
+        self.assertEqual(lines[1], 'b\n')
+        self.assertEqual(lines[2], 'c\n')
+        self.assertEqual(lines.lines, ['c\n'])  # lines before the last accessed one are discarded
+        self.assertRaises(IndexError, lambda: lines[0])
+        lines.close()
+
+    def test_identical(self):
+        file1 = self._write('file1', HEADER + records([0, 10, 20]))
+        file2 = self._write('file2', HEADER + records([10, 20, 30]))
+        self.assertEqual(self._cmp(file1, file2, 0, -1), (0, ''))
+
+    def test_differences(self):
+        file1 = self._write('file1', HEADER + records([0, 10]))
+        file2 = self._write('file2', HEADER + records([0]) + records([10], 1.0 + 1e-10))
+        result, output = self._cmp(file1, file2, 0, -1)
+        self.assertEqual(result, 4)
+        self.assertIn('   0     0.00e+00     0.00e+00     OK', output)
+        self.assertIn('  10     2.50e-10     2.50e-10     FAILED', output)
+
+    def test_header_only(self):
+        file1 = self._write('file1', HEADER)
+        result, output = self._cmp(file1, file1)
+        self.assertEqual(result, -1)
+        self.assertIn('contains only header', output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import tempfile
+import os, sys
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+from ts_fortran_nl import *
+
+NAMELIST = """ &LMGRID
+  startlat_tot = -7.38, startlon_tot = -10.56, ! nstop=99 in a comment
+  pollat = 43.0, pollon = -170.0,
+  ie_tot = 61, je_tot = 51, ke_tot = 60,
+ /
+ &RUNCTL
+  dt = 60.0, nstop=10,
+  lreproduce = .TRUE., luseobs = .FALSE.,
+  nprocx = 1, nprocy = 1, nprocio = 0,
+  ydate_ini='2014010100',
+ /
+ &GRIBOUT
+  ncomb = 0, 10, 1,
+  lcheck = .TRUE.,
+ /
+ &GRIBOUT
+  lcheck = .FALSE.,
+ /"""
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._filename = os.path.join(self._dir.name, 'INPUT_ORG')
+        self._reference = os.path.join(self._dir.name, 'INPUT_REF')
+        for filename in [self._filename, self._reference]:
+            with open(filename, 'w') as f:
+                f.write(NAMELIST)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _read(self, filename):
+        with open(filename) as f:
+            return f.read()
+
+    def test_get(self):
+        nl = Namelist(self._filename)
+        expected = {'dt': '60.0', 'nstop': '10', 'ydate_ini': "'2014010100'", 'lreproduce': '.TRUE.',
+                    'ncomb': '0, 10, 1', 'startlon_tot': '-10.56', 'unknown': ''}
+        for param in expected:
+            self.assertEqual(nl.get(param), expected[param])
+            self.assertEqual(get_param(self._filename, param), expected[param])
+        self.assertEqual(nl.get('lcheck', occurrence=2), '.FALSE.')
+        self.assertEqual(nl.get('lcheck', occurrence=3), '')
+        self.assertEqual(nl.get('NSTOP'), '10')
+
+    def test_groups(self):
+        nl = Namelist(self._filename)
+        self.assertEqual(nl.get('runctl:nstop'), '10')
+        self.assertEqual(nl.get('lmgrid:nstop'), '')
+        self.assertEqual(nl.get('gribout:lcheck', occurrence=2), '.FALSE.')
+        nl.set('GRIBOUT:lcheck', 'lcheck=.FALSE.')
+        self.assertEqual(nl.get('lcheck'), '.FALSE.')
+        self.assertRaises(SkipError, nl.set, 'lmgrid:dt', 'dt=30.0')
+
+    def test_values(self):
+        text = """ &DYNCTL ! comment with / and 'quote'
+  yvarml = 'U ', 'V',  ! first line
+           'it''s',
+  hlev = 3*0.0, 1.5d2, , 2*, -1.D-3
+  lspubc = T, .false., lexpl=.true. /
+ &end"""
+        with open(self._filename, 'w') as f:
+            f.write(text)
+        nl = Namelist(self._filename)
+        self.assertEqual(nl.get('yvarml'), "'U ', 'V', 'it''s'")
+        self.assertEqual(nl.values('yvarml'), ['U ', 'V', "it's"])
+        self.assertEqual(nl.values('hlev'), [0.0, 0.0, 0.0, 150.0, None, None, None, -0.001])
+        self.assertEqual(nl.values('lspubc'), [True, False])
+        self.assertEqual(nl.values('dynctl:lexpl'), [True])
+        self.assertEqual(nl.values('unknown'), None)
+        # values on continuation lines are replaced as well, the rest of the file is kept
+        nl.set('yvarml', "yvarml='T'")
+        nl.write()
+        self.assertEqual(self._read(self._filename), text.replace("""yvarml = 'U ', 'V',  ! first line
+           'it''s',""", "yvarml='T',") + '\n')
+
+    def test_exponent(self):
+        # d exponents are returned as e exponents (removed if 0) such that float() can convert them
+        with open(self._filename, 'w') as f:
+            f.write(" &RUNCTL\n  dt = 1.0d0, hstop = 2.5D-1, nstop = 3*1d+2, yform = 'a1.0d0',\n /\n")
+        self.assertEqual(get_param(self._filename, 'dt'), '1.0')
+        self.assertEqual(float(get_param(self._filename, 'dt')), 1.0)
+        self.assertEqual(get_param(self._filename, 'hstop'), '2.5e-1')
+        self.assertEqual(Namelist(self._filename).values('nstop'), [100.0, 100.0, 100.0])
+        self.assertEqual(get_param(self._filename, 'yform'), "'a1.0d0'")
+
+    def test_set(self):
+        modifications = [('nstop', ' nstop=20', 1), ('nprocx', ' nprocx=4', 1),
+                         ('lcheck', ' lcheck=.TRUE.', 2), ('dt', 'dt=30.0', 1),
+                         ('nstop', 'hstop=1.0', 1), ('ydate_ini', "ydate_ini='2015010100'", 1)]
+        nl = Namelist(self._filename)
+        for (param, newparamstr, occurrence) in modifications:
+            nl.set(param, newparamstr, occurrence=occurrence)
+            replace_param(self._reference, param, newparamstr, occurrence=occurrence)
+        # only the modified assignments are parsed again, the others are moved
+        self.assertEqual(nl.assignments, parse(nl.text))
+        # file is only written at the end
+        self.assertEqual(self._read(self._filename), NAMELIST)
+        nl.write()
+        self.assertEqual(self._read(self._filename), self._read(self._reference))
+        self.assertEqual(nl.get('hstop'), '1.0')
+        self.assertEqual(nl.get('nstop'), '')
+        # only the assignments are modified
+        expected = NAMELIST.replace('dt = 60.0, nstop=10,', 'dt=30.0,  hstop=1.0,')
+        expected = expected.replace('nprocx = 1,', ' nprocx=4,').replace("'2014010100'", "'2015010100'")
+        expected = expected.replace('  lcheck = .FALSE.,', '   lcheck=.TRUE.,')
+        self.assertEqual(self._read(self._filename), expected + '\n')
+
+    def test_set_missing(self):
+        nl = Namelist(self._filename)
+        self.assertRaises(SkipError, nl.set, 'unknown', 'unknown=1')
+        self.assertRaises(SkipError, nl.set, 'lcheck', 'lcheck=.TRUE.', 3)
+
+    def test_unmodified(self):
+        nl = Namelist(self._filename)
+        nl.get('dt')
+        os.remove(self._filename)
+        nl.write()
+        self.assertFalse(os.path.exists(self._filename))
+
+    def test_cache(self):
+        clear_cache()
+        self.assertEqual(get_param(self._filename, 'nstop'), '10')
+        lines, assignments = parse_file(self._filename)
+        self.assertIs(parse_file(self._filename)[1], assignments)
+        # modification with the same size within the resolution of the timestamps
+        replace_param(self._filename, 'nstop', 'nstop=20')
+        self.assertEqual(get_param(self._filename, 'nstop'), '20')
+        os.remove(self._filename)
+        self.assertRaises(SkipError, get_param, self._filename, 'nstop')
+
+    def test_source(self):
+        nl = Namelist(self._filename, source=self._reference)
+        nl.set('nstop', 'nstop=20')
+        nl.write()
+        self.assertEqual(self._read(self._reference), NAMELIST)
+        # cache is primed with the written content
+        self.assertIs(parse_file(self._filename)[1], nl.assignments)
+        self.assertEqual(get_param(self._filename, 'nstop'), '20')
+        self.assertEqual(get_param(self._reference, 'nstop'), '10')
+
+
+if __name__ == "__main__":
+    unittest.main()
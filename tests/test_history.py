@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import tempfile
+import os, sys
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+from ts_history import *
+
+class Options(object):
+    steps = None
+
+class Logger(object):
+    def __init__(self):
+        self.warnings = []
+    def warning(self, msg):
+        self.warnings.append(msg)
+
+class FakeTest(object):
+    def __init__(self, name, timings, resources=None):
+        self.type = 'basic'
+        self.name = name
+        self.basedir = os.path.dirname(os.path.abspath(__file__)) + '/'
+        self.executable = os.path.basename(__file__)
+        self.nprocs = 16
+        self.options = Options()
+        self.logger = Logger()
+        self.timings = timings
+        self.resources = resources
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._filename = os.path.join(self._dir.name, 'history.json')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_estimate(self):
+        h = RuntimeHistory(self._filename)
+        t = FakeTest('test_1', {'prepare': 1.0, 'run': 10.0, 'check': 2.0})
+        self.assertEqual(h.estimate(t), None)
+        self.assertEqual(h.eta([t]), None)
+        h.record(t)
+        self.assertEqual(h.estimate(t), 13.0)
+        self.assertEqual(h.estimate(FakeTest('test_2', {})), None)
+
+    def test_persistence(self):
+        h = RuntimeHistory(self._filename)
+        h.record(FakeTest('test_1', {'prepare': 1.0, 'run': 10.0, 'check': 2.0}))
+        h.record(FakeTest('test_2', {'prepare': 1.0, 'run': 4.0, 'check': 1.0}))
+        h.save()
+        h = RuntimeHistory(self._filename)
+        tests = [FakeTest('test_1', {}), FakeTest('test_2', {})]
+        self.assertEqual(h.estimate(tests[0]), 13.0)
+        self.assertEqual(h.eta(tests, 1), 19.0)
+        self.assertEqual(h.eta(tests, 2), 13.0)
+
+    def test_regression(self):
+        h = RuntimeHistory(self._filename)
+        h.record(FakeTest('test_1', {'run': 10.0}))
+        t = FakeTest('test_1', {'run': 12.0})
+        h.record(t)
+        self.assertEqual(t.logger.warnings, [])
+        t = FakeTest('test_1', {'run': 40.0})
+        h.record(t)
+        self.assertEqual(len(t.logger.warnings), 1)
+
+    def test_memory_regression(self):
+        h = RuntimeHistory(self._filename)
+        h.record(FakeTest('test_1', {'run': 10.0}, {'maxrss': 100.0}))
+        t = FakeTest('test_1', {'run': 10.0}, {'maxrss': 140.0})
+        h.record(t)
+        self.assertEqual(t.logger.warnings, [])
+        t = FakeTest('test_1', {'run': 10.0}, {'maxrss': 400.0})
+        h.record(t)
+        self.assertEqual(len(t.logger.warnings), 1)
+
+    def test_skipped_tests(self):
+        h = RuntimeHistory(self._filename)
+        h.record(FakeTest('test_1', {'prepare': 1.0}))
+        self.assertEqual(h.estimate(FakeTest('test_1', {})), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import tempfile
+import os, sys
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+from ts_logwatcher import *
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._filename = os.path.join(self._dir.name, 'exe.log')
+        self._watcher = LogWatcher(self._filename, make_patterns(crash_patterns))
+
+    def tearDown(self):
+        self._watcher.close()
+        self._dir.cleanup()
+
+    def _write(self, text):
+        with open(self._filename, 'a') as f:
+            f.write(text)
+
+    def test_missing_file(self):
+        self.assertEqual(self._watcher.poll(), None)
+
+    def test_incremental(self):
+        self._write('SETUP OF THE LM\n  PROGRAM TERMINATED BEC')
+        self.assertEqual(self._watcher.poll(), None)
+        self._write('AUSE OF ERRORS DETECTED\nmore output\n')
+        match = self._watcher.poll()
+        self.assertEqual(match.lineno, 2)
+        self.assertEqual(match.line, '  PROGRAM TERMINATED BECAUSE OF ERRORS DETECTED')
+        self.assertEqual(match.pattern, 'PROGRAM TERMINATED BECAUSE OF ERRORS')
+
+    def test_final(self):
+        # an incomplete last line is only searched once the model has finished
+        self._write('CLEAN UP\nforrtl: severe (174): SIGSEGV')
+        self.assertEqual(self._watcher.poll(), None)
+        self.assertEqual(self._watcher.poll(final=True).lineno, 2)
+
+    def test_no_patterns(self):
+        self._write('MPI_ABORT was invoked\n')
+        self.assertEqual(LogWatcher(self._filename, []).poll(final=True), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import threading
+import os, sys
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+from ts_scheduler import *
+
+class Logger(object):
+    color = False
+    def __init__(self):
+        self.messages = []
+    def important(self, msg):
+        self.messages.append(msg)
+    def debug(self, msg):
+        pass
+    def flush(self):
+        pass
+
+class FakeTest(object):
+    def __init__(self, name, result=0, depend=None):
+        self.type = 'basic'
+        self.name = name
+        self.rundir = '/work/basic/' + name + '/'
+        self.dependdir = depend
+        self.nprocs = 16
+        self.result = result
+        self.cancelled = False
+    def cancel(self):
+        self.cancelled = True
+
+class Test(unittest.TestCase):
+
+    def test_dependencies(self):
+        tests = [FakeTest('test_1'), FakeTest('test_2', depend='../test_1'), FakeTest('test_3')]
+        order = []
+        def action(test):
+            order.append(test.name)
+            return False
+        Scheduler(tests, 1, action, Logger()).run()
+        self.assertEqual(len(order), 3)
+        self.assertLess(order.index('test_1'), order.index('test_2'))
+
+    def test_skip_dependents(self):
+        tests = [FakeTest('test_1', result=30), FakeTest('test_2', depend='../test_1'),
+                 FakeTest('test_3', depend='../test_2'), FakeTest('test_4')]
+        run = []
+        skipped = []
+        def action(test):
+            run.append(test.name)
+            return False
+        def skip_action(test, reason):
+            skipped.append(test.name)
+        Scheduler(tests, 2, action, Logger(), skip_action=skip_action).run()
+        self.assertEqual(sorted(run), ['test_1', 'test_4'])
+        self.assertEqual(skipped, ['test_2', 'test_3'])
+
+    def test_cancel(self):
+        tests = [FakeTest('test_1', result=20), FakeTest('test_2')]
+        cancelled = threading.Event()
+        def action(test):
+            if test.name == 'test_1':
+                return True # stop
+            # the model of test_2 runs until it is cancelled
+            while not test.cancelled:
+                cancelled.wait(0.01)
+            return False
+        stop = Scheduler(tests, 2, action, Logger()).run()
+        self.assertTrue(stop)
+        self.assertFalse(tests[0].cancelled)
+        self.assertTrue(tests[1].cancelled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import tempfile
+import os, sys, time
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+from ts_supervisor import *
+from ts_logwatcher import LogWatcher, make_patterns
+
+class Logger(object):
+    def __init__(self):
+        self.errors = []
+    def debug(self, msg):
+        pass
+    def info(self, msg):
+        pass
+    def error(self, msg):
+        self.errors.append(msg)
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._supervisor = Supervisor(interval=0.01)
+        self._logger = Logger()
+
+    def test_exit_status(self):
+        job = self._supervisor.launch('exit 3', self._logger)
+        self.assertEqual(self._supervisor.wait(job), 3)
+        self.assertTrue(job.done())
+
+    def test_concurrent_jobs(self):
+        start = time.time()
+        jobs = [self._supervisor.launch('sleep 0.5', self._logger) for i in range(4)]
+        for job in jobs:
+            self.assertFalse(job.done())
+        self.assertEqual([self._supervisor.wait(job) for job in jobs], [0, 0, 0, 0])
+        self.assertLess(time.time() - start, 2.0)
+
+    def test_timeout(self):
+        start = time.time()
+        job = self._supervisor.launch('sleep 10', self._logger, timeout=1)
+        self.assertEqual(self._supervisor.wait(job), -2)
+        self.assertTrue(job.timed_out)
+        self.assertLess(time.time() - start, 5.0)
+        self.assertEqual(len(self._logger.errors), 1)
+
+    def test_signal(self):
+        # a model killed by SIGINT has the same status as a timeout
+        job = self._supervisor.launch(['sh', '-c', 'kill -INT $$'], self._logger)
+        self.assertEqual(self._supervisor.wait(job), -2)
+        self.assertFalse(job.timed_out)
+
+    def test_cwd(self):
+        d = tempfile.mkdtemp()
+        job = self._supervisor.launch('touch marker', self._logger, cwd=d)
+        self.assertEqual(self._supervisor.wait(job), 0)
+        self.assertTrue(os.path.exists(os.path.join(d, 'marker')))
+        os.remove(os.path.join(d, 'marker'))
+        os.rmdir(d)
+
+    def _alive(self, pid):
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            return False
+        # the process may be a zombie which has not been reaped yet
+        with open('/proc/%d/stat' % pid) as f:
+            return f.read().split(')')[-1].split()[0] != 'Z'
+
+    def test_kill_process_group(self):
+        # processes started by the command (e.g. MPI ranks) are killed on timeout as well
+        d = tempfile.mkdtemp()
+        job = self._supervisor.launch('sleep 30 & echo $! > pid; wait', self._logger, cwd=d, timeout=1)
+        self.assertEqual(self._supervisor.wait(job), -2)
+        with open(os.path.join(d, 'pid')) as f:
+            pid = int(f.read())
+        time.sleep(0.1)
+        self.assertFalse(os.path.exists('/proc/%d' % pid) and self._alive(pid))
+        os.remove(os.path.join(d, 'pid'))
+        os.rmdir(d)
+
+    def test_argv(self):
+        # arguments are passed without a shell, output is written to a file
+        d = tempfile.mkdtemp()
+        output = os.path.join(d, 'exe.log')
+        job = self._supervisor.launch(['echo', 'a  b', '$HOME'], self._logger, output=output)
+        self.assertEqual(self._supervisor.wait(job), 0)
+        with open(output) as f:
+            self.assertEqual(f.read(), 'a  b $HOME\n')
+        os.remove(output)
+        os.rmdir(d)
+
+    def test_resources(self):
+        # resources of processes started by the command are included (here a Python interpreter
+        # holding about 64 MiB of memory and busy for some CPU time)
+        code = 'x = bytearray(64*1024*1024); sum(range(3000000))'
+        job = self._supervisor.launch('%s -c "%s"; true' % (sys.executable, code), self._logger)
+        self.assertEqual(self._supervisor.wait(job), 0)
+        resources = job.resources()
+        self.assertGreater(resources['maxrss'], 60.0)
+        self.assertGreater(resources['user'] + resources['sys'], 0.0)
+
+    def test_crash_pattern(self):
+        # the job is terminated as soon as a crash pattern appears in its output
+        d = tempfile.mkdtemp()
+        output = os.path.join(d, 'exe.log')
+        watcher = LogWatcher(output, make_patterns(['MPI_ABORT']))
+        start = time.time()
+        job = self._supervisor.launch('echo start; echo MPI_ABORT was invoked; exec sleep 10', self._logger,
+                                      output=output, watcher=watcher)
+        self.assertEqual(self._supervisor.wait(job), -15)
+        self.assertLess(time.time() - start, 5.0)
+        self.assertEqual(job.crash.lineno, 2)
+        os.remove(output)
+        os.rmdir(d)
+
+    def test_kill(self):
+        job = self._supervisor.launch(['sleep', '10'], self._logger)
+        self._supervisor.kill(job)
+        self.assertEqual(self._supervisor.wait(job), -15)
+
+
+    def test_kill_all(self):
+        # all running jobs are killed (e.g. when the testsuite is aborted)
+        start = time.time()
+        jobs = [self._supervisor.launch(['sleep', '10'], self._logger) for i in range(3)]
+        self._supervisor.kill_all()
+        self.assertEqual([self._supervisor.wait(job) for job in jobs], [-15, -15, -15])
+        self.assertLess(time.time() - start, 5.0)
+
+if __name__ == "__main__":
+    unittest.main()
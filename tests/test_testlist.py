@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import tempfile
+import os, sys
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+from ts_testlist import *
+
+TESTLIST = """<?xml version="1.0" encoding="utf-8"?>
+<testlist>
+  <test name="test_1" type="cosmo7">
+    <executable>cosmo</executable>
+    <tag>fast, physics</tag>
+    <checker>run_success_check.py</checker>
+    <checker>tolerance_check.py</checker>
+  </test>
+  <test name="test_2" type="cosmo7">
+    <namelistdir>cosmo7/test_1</namelistdir>
+    <refoutdir>../test_1</refoutdir>
+    <depend>../test_1</depend>
+    <checker>identical_check.py</checker>
+  </test>
+  <test name="test_3" type="cosmo1">
+    <tag>slow</tag>
+    <checker>run_success_check.py</checker>
+  </test>
+</testlist>"""
+
+class Logger(object):
+    def __init__(self):
+        self.messages = []
+    def debug(self, msg):
+        self.messages.append(msg)
+    def warning(self, msg):
+        self.messages.append(msg)
+
+class Options(object):
+    def __init__(self, only=None, match=None, tag=None, checker=None, changed=None, exe=None):
+        self.only = only
+        self.match = match
+        self.tag = tag
+        self.checker = checker
+        self.changed = changed
+        self.exe = exe
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._testlist = os.path.join(self._dir.name, 'testlist.xml')
+        with open(self._testlist, 'w') as f:
+            f.write(TESTLIST)
+        self._logger = Logger()
+        self._tests = load_testlist(self._testlist, self._logger)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _select(self, **kwargs):
+        return [entry['name'] for entry in select_tests(self._tests, Options(**kwargs), self._dir.name)]
+
+    def test_entries(self):
+        self.assertEqual([entry['name'] for entry in self._tests], ['test_1', 'test_2', 'test_3'])
+        self.assertEqual(self._tests[0]['tags'], ['fast', 'physics'])
+        self.assertEqual(self._tests[1]['namelistdir'], 'cosmo7/test_1/')
+        self.assertEqual(self._tests[1]['refoutdir'], '../test_1/')
+        self.assertEqual(self._tests[2]['refoutdir'], 'cosmo1/test_3/')
+        self.assertEqual(xml_node(self._tests[1]).findtext('depend'), '../test_1')
+
+    def test_select(self):
+        self.assertEqual(self._select(), ['test_1', 'test_2', 'test_3'])
+        self.assertEqual(self._select(only=['cosmo7,test_2']), ['test_2'])
+        self.assertEqual(self._select(only=['cosmo7,*', 'cosmo1,test_3']), ['test_1', 'test_2', 'test_3'])
+        self.assertEqual(self._select(only=['cosmo?']), ['test_1', 'test_2', 'test_3'])
+        self.assertEqual(self._select(match='_[23]$'), ['test_2', 'test_3'])
+        self.assertEqual(self._select(tag=['slow,physics']), ['test_1', 'test_3'])
+        self.assertEqual(self._select(checker=['run_success_check.py'], only=['cosmo7,*']), ['test_1'])
+
+    def test_changed(self):
+        data = os.path.join(self._dir.name, 'data')
+        # namelist of test_1 is used by test_2 (which also compares against test_1)
+        self.assertEqual(self._select(changed=[os.path.join(data, 'cosmo7/test_1/INPUT_ORG')]), ['test_1', 'test_2'])
+        self.assertEqual(self._select(changed=[os.path.join(data, 'cosmo1/input/laf2015')]), ['test_3'])
+        self.assertEqual(self._select(changed=[os.path.join(self._dir.name, 'cosmo')]), ['test_1', 'test_2'])
+        self.assertEqual(self._select(changed=[os.path.join(checkerdir, 'identical_check.py')]), ['test_2'])
+        self.assertEqual(self._select(changed=[os.path.join(sourcedir, 'tools/ts_testcase.py')]),
+                         ['test_1', 'test_2', 'test_3'])
+        self.assertEqual(self._select(changed=[os.path.join(data, 'cosmo2/test_1/INPUT_ORG')]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+# built-in modules
+import unittest
+import tempfile
+import os, sys
+
+# private modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
+from ts_utilities import *
+
+class Logger(object):
+    def __init__(self):
+        self.messages = []
+    def debug(self, msg):
+        self.messages.append(msg)
+    def info(self, msg):
+        self.messages.append(msg)
+    def error(self, msg):
+        self.messages.append(msg)
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._src = os.path.join(self._dir.name, 'src')
+        self._dst = os.path.join(self._dir.name, 'dst')
+        os.makedirs(os.path.join(self._src, 'sub'))
+        os.makedirs(self._dst)
+        self._write(os.path.join(self._src, 'model'), 'binary' * 100000)
+        os.chmod(os.path.join(self._src, 'model'), 0o755)
+        self._write(os.path.join(self._src, 'sub', 'file'), 'content')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _write(self, filename, text):
+        with open(filename, 'w') as f:
+            f.write(text)
+
+    def _read(self, filename):
+        with open(filename, 'r') as f:
+            return f.read()
+
+    def test_copy_file(self):
+        copy_file(os.path.join(self._src, 'model'), self._dst)
+        dst = os.path.join(self._dst, 'model')
+        self.assertEqual(self._read(dst), 'binary' * 100000)
+        self.assertTrue(os.access(dst, os.X_OK))
+        # overwrite existing file
+        self._write(dst, 'old content which is longer than the new one' * 100000)
+        copy_file(os.path.join(self._src, 'sub', 'file'), dst)
+        self.assertEqual(self._read(dst), 'content')
+
+    def test_copy_tree(self):
+        copy_tree(self._src, self._dst)
+        self.assertEqual(self._read(os.path.join(self._dst, 'sub', 'file')), 'content')
+
+    def test_remove_directory_content(self):
+        copy_tree(self._src, self._dst)
+        os.symlink(self._src, os.path.join(self._dst, 'input'))
+        self._write(os.path.join(self._dst, '.hidden'), '')
+        remove_directory_content(self._dst)
+        self.assertEqual(os.listdir(self._dst), ['.hidden'])
+        # the target of the link is not removed
+        self.assertTrue(os.path.exists(os.path.join(self._src, 'sub', 'file')))
+
+    def test_store_file(self):
+        store = os.path.join(self._dir.name, 'store')
+        stored = store_file(os.path.join(self._src, 'model'), store)
+        self.assertEqual(store_file(os.path.join(self._src, 'model'), store), stored)
+        self.assertEqual(len(os.listdir(store)), 1)
+        link_file(stored, os.path.join(self._dst, 'model'))
+        link_file(stored, os.path.join(self._dst, 'model'))
+        self.assertTrue(os.path.samefile(stored, os.path.join(self._dst, 'model')))
+        self.assertTrue(os.access(os.path.join(self._dst, 'model'), os.X_OK))
+
+    def test_prune_store(self):
+        store = os.path.join(self._dir.name, 'store')
+        old = []
+        for i in range(4):
+            os.makedirs(os.path.join(store, 'old%i' %(i)))
+            os.utime(os.path.join(store, 'old%i' %(i)), (1000+i, 1000+i))
+            old.append(os.path.join(store, 'old%i' %(i)))
+        stored = store_file(os.path.join(self._src, 'model'), store)
+        link_file(stored, os.path.join(self._dst, 'model'))
+        # the entry used by this invocation and the most recent unused ones are kept
+        self.assertEqual(sorted(prune_store(store, keep=2)), old[:2])
+        self.assertEqual(sorted(os.listdir(store)),
+                         sorted([os.path.basename(os.path.dirname(stored)), 'old2', 'old3']))
+        self.assertEqual(prune_store(store, keep=2), [])
+        self.assertEqual(prune_store(os.path.join(self._dir.name, 'missing')), [])
+
+    def test_system_command(self):
+        logger = Logger()
+        status, output = system_command('echo line; exit 3', logger, throw_exception=False,
+                                        return_output=True, issue_error=False)
+        self.assertEqual((status, output), (3, 'line\n'))
+        self.assertEqual(system_command('echo line', logger), 0)
+        self.assertIn('   Out: line', logger.messages)
+        # list of arguments is executed without a shell
+        status, output = system_command(['echo', '$HOME', 'a;b'], logger, return_output=True)
+        self.assertEqual(output, '$HOME a;b\n')
+
+    def test_large_output(self):
+        # output larger than the pipe buffer, only the tail is kept in memory
+        logger = Logger()
+        cmd = 'for i in $(seq 1 20000); do echo "line $i of the output"; done'
+        status, output, path = run_command(cmd, logger, log_output=False, timeout=60, max_output=1000,
+                                           keep_output=True)
+        self.assertEqual(status, 0)
+        self.assertIn('Full output of system command in ' + path, logger.messages)
+        self.assertTrue(output.startswith('[... '))
+        self.assertTrue(output.endswith('line 20000 of the output\n'))
+        self.assertLess(len(output), 1200)
+        try:
+            lines = self._read(path).splitlines()
+            self.assertEqual(len(lines), 20000)
+            self.assertEqual(lines[0], 'line 1 of the output')
+        finally:
+            os.remove(path)
+        # the temporary file is removed unless it is kept
+        spilled = set(os.listdir(tempfile.gettempdir()))
+        status, output, path = run_command(cmd, logger, log_output=False, timeout=60, max_output=1000)
+        self.assertEqual(path, None)
+        self.assertEqual(set(os.listdir(tempfile.gettempdir())) - spilled, set())
+        self.assertTrue(output.startswith('[... '))
+        self.assertNotIn('full output in', output)
+
+    def test_timeout(self):
+        logger = Logger()
+        filename = os.path.join(self._dir.name, 'output')
+        status, output, path = run_command('echo start; exec sleep 10', logger, timeout=1, output_file=filename)
+        self.assertEqual(status, -2)
+        self.assertEqual(output, 'start\n')
+        self.assertEqual(self._read(path), 'start\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
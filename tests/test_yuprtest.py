@@ -18,10 +18,12 @@ c.print_results()
 # built-in modules
 import unittest
 from tempfile import NamedTemporaryFile
-import os
+import os, sys, io, random, contextlib
 
 # other modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../tools")) # this is the generic folder for subroutines
 from ts_thresholds import Thresholds
+import ts_yuprtest
 
 # information
 __author__      = "Oliver Fuhrer, Santiago Moreno"
@@ -466,6 +468,115 @@ class Test(unittest.TestCase):
             self.assertEqual(c.thresholds[0][0], 6.9999999999999998e-09)
             c.print_results()
 
+    def _results(self, compare, filename1, filename2, thresh):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            c = compare(filename1, filename2, thresh)
+            status = c.compare_data()
+            c.print_results()
+        return status, repr(c._status), repr(c._maxdiff), out.getvalue()
+
+    def test_vectorized_compare(self):
+        # the columnar engine of ts_yuprtest gives the same results as the record by record
+        # comparison of this module (also with NaNs and thresholds of several variables)
+        random.seed(0)
+        f = NamedTemporaryFile(mode='w', delete=False)
+        for line in self._s.strip().split('\n'):
+            data = line.split()
+            if len(data) == 10 and data[0] != '#':
+                for i in [3, 6, 9]:
+                    x = random.random()
+                    if x < 0.1:
+                        data[i] = 'NaN'
+                    elif x < 0.6:
+                        data[i] = repr(float(data[i]) * (1.0 + random.choice([1e-12, 1e-6, 1e-2])))
+                line = ' '.join(data)
+            f.write(line + '\n')
+        f.close()
+        thresholds = [self._t, self._t.replace('1.00e-15', '1.00e-06'),
+                      self._t.replace('minval = 1e-12', 'minval = -1.0') + '      U =   1.00e-01   0.0   0.0   0.0\n']
+        try:
+            for t in thresholds:
+                for filename in [self._filename2, f.name]:
+                    self.assertEqual(self._results(ts_yuprtest.Compare, self._filename1, filename, t),
+                                     self._results(Compare, self._filename1, filename, t))
+        finally:
+            os.remove(f.name)
+
+    def test_aligned_compare(self):
+        # records are matched by (var, step, level), the order of the files does not matter
+        # and additional records of the run are only reported
+        lines = self._s.strip().split('\n')
+        header = [line for line in lines if len(line.split()) != 10 or line.split()[0] == '#']
+        records = [line for line in lines if len(line.split()) == 10 and line.split()[0] != '#']
+        extra = '       W     0    1   1.0E+00    9    1   2.0E+00   77   22   3.0E+00'
+        run = NamedTemporaryFile(mode='w', delete=False)
+        run.write('\n'.join(header + records[::-1] + [extra]) + '\n')
+        run.close()
+        ref = NamedTemporaryFile(mode='w', delete=False)
+        ref.write('\n'.join(header + records) + '\n')
+        ref.close()
+        try:
+            status, _, _, out = self._results(ts_yuprtest.Compare, run.name, ref.name, self._t)
+            self.assertEqual(status, 0)
+            self.assertIn('1 records of %s not found in %s (var nt lev): W 0 1' % (run.name, ref.name), out)
+            c = ts_yuprtest.Compare(run.name, ref.name, self._t)
+            c.compare_data()
+            self.assertEqual(c._lineno, len(records))
+            self.assertEqual(c._missing, [])
+            self.assertEqual(c._extra, [('W', 0, 1)])
+        finally:
+            os.remove(run.name)
+            os.remove(ref.name)
+
+    def test_missing_records(self):
+        # records of the reference which are missing in the run make their timestep fail
+        lines = self._s.strip().split('\n')
+        run = NamedTemporaryFile(mode='w', delete=False)
+        run.write('\n'.join([line for line in lines if not line.split()[:3] == ['V', '10', '2']]) + '\n')
+        run.close()
+        try:
+            status, results, _, out = self._results(ts_yuprtest.Compare, run.name, self._filename2, self._t)
+            self.assertEqual(status, 2)
+            self.assertEqual(results, "{'0': 0, '10': 2}")
+            self.assertIn('1 records of %s not found in %s (var nt lev): V 10 2' % (self._filename2, run.name), out)
+            self.assertIn('FAIL  records missing (V 10 2)', out)
+        finally:
+            os.remove(run.name)
+
+    def test_cache(self):
+        cachedir = os.path.join(os.path.dirname(self._filename1), 'yucache_%d' % os.getpid())
+        os.utime(self._filename1, (0, 0))  # files modified recently are not cached
+        try:
+            y = ts_yuprtest.Yuprtest(self._filename1, cachedir)
+            self.assertEqual(len(os.listdir(cachedir)), 1)
+            cached = ts_yuprtest.Yuprtest(self._filename1, cachedir)
+            self.assertEqual(cached._records, None)  # loaded from the cache
+            self.assertEqual(cached, y)
+            self.assertEqual(cached.steps, [0, 10])
+            self.assertEqual(cached.variables, ["TKE", "U", "V"])
+            # a modified file is parsed again and replaces the old entry
+            with open(self._filename1, 'a') as f:
+                f.write('       U    20    1   1.0E+00    9    1   2.0E+00   77   22   3.0E+00\n')
+            os.utime(self._filename1, (0, 10))
+            y = ts_yuprtest.Yuprtest(self._filename1, cachedir)
+            self.assertEqual(y.steps, [0, 10, 20])
+            self.assertEqual(len(os.listdir(cachedir)), 1)
+            self.assertEqual(ts_yuprtest.Yuprtest(self._filename1, cachedir).data[-1], ['U', 20, 1, 1.0, 2.0, 3.0])
+            # damaged entries (truncated or empty) are parsed again and replaced
+            for size in [100, 0]:
+                entry = os.path.join(cachedir, os.listdir(cachedir)[0])
+                with open(entry, 'r+b') as f:
+                    f.truncate(size)
+                y = ts_yuprtest.Yuprtest(self._filename1, cachedir)
+                self.assertNotEqual(y._records, None)
+                self.assertEqual(y.steps, [0, 10, 20])
+                self.assertEqual(ts_yuprtest.Yuprtest(self._filename1, cachedir)._records, None)
+        finally:
+            for name in os.listdir(cachedir):
+                os.remove(os.path.join(cachedir, name))
+            os.rmdir(cachedir)
+
 
 if __name__ == "__main__":
     unittest.main()
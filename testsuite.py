@@ -10,9 +10,8 @@ For further help and command line arguments execute this script without argument
 """
 
 # built-in modules
-import os, sys, string, struct
+import os, sys, re, string, struct, signal
 import optparse as OP
-import xml.etree.ElementTree as XML
 import logging as LG
 import configparser
 import ast
@@ -20,9 +19,16 @@ import ast
 # private modules
 sys.path.append(os.path.join(os.path.dirname(__file__), "./tools")) # this is the generic folder for subroutines
 from ts_error import StopError, SkipError
-from ts_utilities import system_command, change_dir, timeout_supported
+from ts_utilities import timeout_supported, prune_store, dir_path
 import ts_logger as LG
 from ts_testcase import Test
+from ts_scheduler import Scheduler
+from ts_history import RuntimeHistory
+from ts_resources import log_resources, write_resources
+from ts_logwatcher import make_patterns, crash_patterns
+from ts_cache import ResultCache, SharedRuns
+from ts_supervisor import supervisor
+from ts_testlist import load_testlist, select_tests, xml_node
 from default_values import DefaultValues
 
 # information
@@ -56,6 +62,10 @@ def parse_config_file(filename, logger):
         conf.pert_avail  = config.get('ts_config','pert_avail')
         conf.yufile      = config.get('ts_config','yufile')
         conf.dual_params = ast.literal_eval(config.get('ts_config','dual_params'))
+        if config.has_option('ts_config','crash_patterns'):
+            conf.crash_patterns = make_patterns(ast.literal_eval(config.get('ts_config','crash_patterns')))
+        else:
+            conf.crash_patterns = make_patterns(crash_patterns)
 
     except Exception as e:
         print('Error while reading config file '+filename+':')
@@ -88,6 +98,31 @@ def parse_cmdline():
     parser.add_option("--nprocio",type="int",dest="nprocio",
                help="set number of asynchronous IO processor, [default=<from namelist>]")
 
+    # defines the number of tests which are run concurrently
+    parser.set_defaults(jobs=DefaultValues.jobs)
+    parser.add_option("-j","--jobs",type="int",dest="jobs",
+               help="number of tests to run concurrently, tests are started once the tests they depend on have "+
+                    "finished (only used when running tests) [default=<sequential>]")
+
+    # defines the total number of cores available to concurrently running tests
+    parser.set_defaults(cores=DefaultValues.cores)
+    parser.add_option("--cores",type="int",dest="cores",
+               help="total number of cores available for running tests concurrently, tests are packed "+
+                    "according to their number of processors (implies --jobs) [default=<unlimited>]")
+
+    # defines the number of concurrent checks when running tests concurrently
+    parser.set_defaults(check_jobs=DefaultValues.check_jobs)
+    parser.add_option("--check-jobs",type="int",dest="check_jobs",
+               help=("number of tests whose checkers are run concurrently to the model runs of other tests "+
+                     "when using --jobs, 0 to call the checkers directly after the model run [default=%d]"
+                     % DefaultValues.check_jobs))
+
+    # defines the number of checkers of a test which are called concurrently
+    parser.set_defaults(checker_threads=DefaultValues.checker_threads)
+    parser.add_option("--checker-threads",type="int",dest="checker_threads",
+               help=("number of checkers of a single test which are called concurrently "+
+                     "(1 when tuning thresholds) [default=%d]" % DefaultValues.checker_threads))
+
     # defines the behavior of testsuite after fail or crash
     parser.add_option("-f","--force",action="store_true",dest="force",default=False,
                help="do not stop upon error")
@@ -106,6 +141,12 @@ def parse_cmdline():
     parser.add_option("--exe",dest="exe",type="string",
                help="Executable file, [default=<from testlist.xml>]")
 
+    # copy the executable into every run directory instead of linking it
+    parser.add_option("--copy-exe",dest="copy_exe",action="store_true",default=DefaultValues.copy_exe,
+               help=("copy the executable into the run directory of every test instead of linking it from "+
+                     "the store in the working directory (e.g. if required by the launcher) [default=%s]"
+                     % DefaultValues.copy_exe))
+
     # defines the arguments to pass to the executable
     parser.set_defaults(args='')
     parser.add_option("--args",dest="args",type="string", help="Arguments to executable, [default='']")
@@ -132,9 +173,19 @@ def parse_cmdline():
     parser.add_option("-a","--append",action="store_true",default=False,dest="outappend",
                help="Appends standard output if redirection selected [default=False]")
 
-    # only one test is executed
-    parser.add_option("--only",dest="only",type="string",action="store",
-               help="Run only one test define as type,name (e.g. --only=cosmo7,test_1)")
+    # selection of the tests to run
+    parser.add_option("--only",dest="only",type="string",action="append",
+               help=("Run only tests defined as type,name which may contain wildcards, can be given several "+
+                     "times (e.g. --only=cosmo7,test_1 or --only='cosmo7,test_*')"))
+    parser.add_option("--match",dest="match",type="string",action="store",
+               help="Run only tests whose type,name matches a regular expression (e.g. --match='^cosmo7,.*restart')")
+    parser.add_option("--tag",dest="tag",type="string",action="append",
+               help="Run only tests with one of the given tags (comma separated, see <tag> in testlist)")
+    parser.add_option("--checker",dest="checker",type="string",action="append",
+               help="Run only tests using one of the given checkers (comma separated)")
+    parser.add_option("--changed",dest="changed",type="string",action="append",
+               help=("Run only tests affected by the given files (comma separated), i.e. tests whose namelists, "+
+                     "reference files, input, checkers or executable have changed and tests depending on them"))
 
     # update namelist (no run). This is useful to quickly change all namelist at once
     parser.add_option("--update-namelist",dest="upnamelist",action="store_true",default=False,
@@ -177,6 +228,32 @@ def parse_cmdline():
     parser.add_option("--workdir",dest="workdir",type="string",action="store",default="./work",
                help="Working directory [default=./work]")
 
+    # file storing the runtimes of the tests
+    parser.add_option("--history",dest="history",type="string",action="store",default=DefaultValues.history,
+               help=("File (relative to working directory) storing the runtime history of the tests, used to "+
+                     "order tests and estimate the remaining time, empty to disable [default=%s]" % DefaultValues.history))
+
+    # export of the resources used by the model runs
+    parser.add_option("--resources",dest="resources",type="string",action="store",default=DefaultValues.resources,
+               help=("CSV file (relative to working directory) to which the wall time, CPU time, peak memory and "+
+                     "block I/O of the model runs are written, empty to disable [default=%s]" % DefaultValues.resources))
+
+    # cache of the results of model runs
+    parser.add_option("--cache",dest="cache",type="string",action="store",default=DefaultValues.cache,
+               help=("Directory (relative to working directory) caching the outputs of model runs, a test whose "+
+                     "executable, input files, namelists, number of processors and arguments are unchanged is "+
+                     "not run again but only checked, empty to disable [default=%s]" % DefaultValues.cache))
+
+    # cache of the parsed reference YUPRTEST files
+    parser.add_option("--yu-cache",dest="yu_cache",type="string",action="store",default=DefaultValues.yu_cache,
+               help=("Directory (relative to working directory) storing the parsed reference YUPRTEST files "+
+                     "of the tolerance checker in binary form, empty to disable [default=%s]" % DefaultValues.yu_cache))
+
+    # sharing of model runs between tests
+    parser.add_option("--share-runs",dest="share_runs",action="store_true",default=DefaultValues.share_runs,
+               help=("run the model only once for tests which only differ in their checkers and pass its "+
+                     "outputs to all of them (except to tests using it as reference) [default=%s]" % DefaultValues.share_runs))
+
     # specifies the tolerance file name for the tolerance checker
     parser.set_defaults(tolerance=DefaultValues.tolerance)
     parser.add_option("--tolerance",dest="tolerance",type="string",action="store",default=DefaultValues.tolerance,
@@ -203,7 +280,7 @@ def parse_cmdline():
 def parse_xmlfile(filename, logger):
 
     try:
-        xmltree = XML.parse(filename)
+        tests = load_testlist(filename, logger)
     except Exception as e:
         logger.error('Error while reading xml file ' + filename + ':')
         logger.error(e)
@@ -212,7 +289,7 @@ def parse_xmlfile(filename, logger):
 
     logger.important('XML file: ' + filename)
 
-    return xmltree.getroot()
+    return tests
 
 
 def setup_logger(options):
@@ -228,6 +305,112 @@ def setup_logger(options):
     return logger
 
 
+def run_test(mytest, options, history=None, pipeline=False):
+    """run all phases of a single test and write its result, return True if the testsuite has to stop
+
+    If pipeline is True, the checkers are not called after a regular model run. Instead None
+    is returned and check_test() has to be called to complete the test."""
+
+    logger = mytest.logger
+    stop = False
+    try:
+
+        # if upyufiles=True, no model run.
+        if options.upyufiles:
+            logger.important('Update YU* files mode, no run')
+            mytest.update_yufiles()
+        #
+        elif options.update_thresholds:
+            logger.important('Updating the thresholds on the current runs')
+            mytest.options.tune_thresholds = True
+            mytest.log_file = 'exe.log'
+            mytest.check()
+        # if upnamelist=True, no model run.
+        elif options.upnamelist:
+            logger.important('Update namelist mode, no run')
+            mytest.options.pert = 0
+            mytest.update_namelist() #copy back namelist in typedir
+        # Spcial setup for ICON where only check is run
+        elif options.icon:
+            logger.important('Running checks for ICON')
+            mytest.options.pert = 0
+            mytest.log_file = 'final_status.txt'
+            mytest.check()
+        else:
+            if(mytest.options.tune_thresholds):
+                mytest.options.pert = 0
+                for i in range(int(mytest.options.tuning_iterations)):
+                    mytest.prepare() # prepare test directory and update namelists
+                    logger.important("Iteration number {0}".format(i+1))
+                    mytest.prerun() # last preparations (dependencies must have finished)
+                    mytest.start()  # start test
+                    mytest.wait()   # wait for completion of test
+                    mytest.check()  # call checkers for this test
+                    mytest.options.reset_thresholds = False
+                    # 1: Perturb only in the first timestep
+                    # 2: Perturb in every iteration
+                    mytest.options.pert = 2
+            else:
+                mytest.options.pert = 0
+                mytest.prepare() # prepare test directory and update namelists
+                mytest.prerun() # last preparations (dependencies must have finished)
+                mytest.start()  # start test
+                mytest.wait()   # wait for completion of test
+                if pipeline:
+                    return None # checkers are called by check_test()
+                mytest.check()  # call checkers for this test
+
+    except SkipError as smessage:
+        mytest.result = 15 # SKIP
+        logger.warning(smessage)
+
+    except StopError as emessage:
+        if str(emessage).strip():
+            logger.error(emessage)
+        if not options.force:
+            stop = True
+
+    return finish_test(mytest, history, stop)
+
+
+def check_test(mytest, options, history=None):
+    """call the checkers of a test whose model run has finished (see run_test()) and write its
+    result, return True if the testsuite has to stop"""
+
+    stop = False
+    try:
+        mytest.check()  # call checkers for this test
+
+    except StopError as emessage:
+        if str(emessage).strip():
+            mytest.logger.error(emessage)
+        if not options.force:
+            stop = True
+
+    return finish_test(mytest, history, stop)
+
+
+def skip_test(mytest, reason, history=None):
+    """skip a test without preparing or running it and write its result"""
+
+    mytest.result = 15 # SKIP
+    mytest.logger.warning(reason)
+    return finish_test(mytest, history, False)
+
+
+def finish_test(mytest, history, stop):
+    """store the runtime and write the result of a test"""
+
+    # store runtime of test
+    if history is not None and mytest.result in [0, 10, 20]:
+        history.record(mytest)
+
+    # write result
+    mytest.write_result()
+
+    return stop
+
+
 def main():
     """read configuration and then execute tests"""
 
@@ -252,93 +435,105 @@ def main():
         sys.exit(1)
     conf = parse_config_file(config_filepath, logger)
 
-    # parse the .xml file which contains the test definitions
-    root = parse_xmlfile(options.testlist, logger)
-
     # generate work directory
     if not os.path.isabs(options.workdir):
         options.workdir = os.path.join(os.getcwd(), options.workdir)
-    status = system_command('/bin/mkdir -p '+options.workdir+'/', logger, throw_exception=False)
-    if status:
-      exit(status)
+    try:
+        os.makedirs(options.workdir, exist_ok=True)
+    except OSError as e:
+        logger.error('Problem creating working directory %s: %s' %(options.workdir, e))
+        sys.exit(1)
 
-    # loops over all the tests
-    stop = False
-    for child in root.findall("test"):
-
-        # create test object
-        mytest = Test(child, options, conf, logger)
-
-        if mytest.run_test():
-            # run test
-            try:
-
-                # if upyufiles=True, no model run.
-                if options.upyufiles:
-                    logger.important('Update YU* files mode, no run')
-                    mytest.update_yufiles()
-                #
-                elif options.update_thresholds:
-                    logger.important('Updating the thresholds on the current runs')
-                    mytest.options.tune_thresholds = True
-                    mytest.log_file = 'exe.log'
-                    mytest.check()
-                # if upnamelist=True, no model run.
-                elif options.upnamelist:
-                    logger.important('Update namelist mode, no run')
-                    mytest.options.pert = 0
-                    mytest.update_namelist() #copy back namelist in typedir
-                # Spcial setup for ICON where only check is run
-                elif options.icon:
-                    logger.important('Running checks for ICON')
-                    mytest.options.pert = 0
-                    mytest.log_file = 'final_status.txt'
-                    mytest.check()
-                else:
-                    if(mytest.options.tune_thresholds):
-                        mytest.options.pert = 0
-                        for i in range(int(mytest.options.tuning_iterations)):
-                            mytest.prepare() # prepare test directory and update namelists
-                            logger.important("Iteration number {0}".format(i+1))
-                            mytest.prerun() # last preparations (dependencies must have finished)
-                            mytest.start()  # start test
-                            mytest.wait()   # wait for completion of test
-                            mytest.check()  # call checkers for this test
-                            mytest.options.reset_thresholds = False
-                            # 1: Perturb only in the first timestep
-                            # 2: Perturb in every iteration
-                            mytest.options.pert = 2
-                    else:
-                        mytest.options.pert = 0
-                        mytest.prepare() # prepare test directory and update namelists
-                        mytest.prerun() # last preparations (dependencies must have finished)
-                        mytest.start()  # start test
-                        mytest.wait()   # wait for completion of test
-                        mytest.check()  # call checkers for this test
-
-            except SkipError as smessage:
-                mytest.result = 15 # SKIP
-                logger.warning(smessage)
-
-            except StopError as emessage:
-                if str(emessage).strip():
-                    logger.error(emessage)
-                if not options.force:
-                    stop = True
-
-            # write result
-            mytest.write_result()
-
-            # return into the base directory after each test
-            status = change_dir(conf.basedir, logger)
+    # parse the .xml file which contains the test definitions
+    testlist = parse_xmlfile(options.testlist, logger)
 
+    # select the tests to run
+    try:
+        selected = select_tests(testlist, options, conf.basedir)
+    except re.error as e:
+        logger.error('Invalid regular expression ' + options.match + ': ' + str(e))
+        sys.exit(1)
+    if len(selected) < len(testlist):
+        logger.info('Selected {0} of {1} tests'.format(len(selected), len(testlist)))
+
+    # cache of the results of model runs and sharing of runs between tests (not used when tuning
+    # thresholds, which requires new runs)
+    if options.cache and not options.tune_thresholds:
+        cache = ResultCache(os.path.join(options.workdir, options.cache))
+    else:
+        cache = None
+    if options.share_runs and not options.tune_thresholds:
+        shared_runs = SharedRuns()
+    else:
+        shared_runs = None
+
+    # create test objects of all tests to run
+    tests = []
+    for entry in selected:
+        mytest = Test(xml_node(entry), options, conf, logger)
+        mytest.cache = cache
+        mytest.shared_runs = shared_runs
+        tests.append(mytest)
+
+    # runtime history of the tests
+    if options.history:
+        history = RuntimeHistory(os.path.join(options.workdir, options.history))
+    else:
+        history = None
+
+    # modes which update files in the data folder are always run sequentially
+    concurrent = (options.jobs is not None or options.cores is not None) and not (options.upyufiles or options.upnamelist or
+                 options.update_thresholds or options.tune_thresholds)
+
+    if concurrent:
+        # run tests concurrently according to their dependencies
+        # the checkers of a test are pipelined with the model runs of the following tests
+        pipeline = options.check_jobs > 0
+        scheduler = Scheduler(tests, options.jobs, lambda test: run_test(test, options, history, pipeline), logger,
+                              cores=options.cores, history=history,
+                              check_action=lambda test: check_test(test, options, history),
+                              check_jobs=options.check_jobs,
+                              skip_action=lambda test, reason: skip_test(test, reason, history))
+        scheduler.run()
+    else:
+        # loops over all the tests
+        for i, mytest in enumerate(tests):
             # exit if required
-            if stop:
+            if run_test(mytest, options, history):
                 break
+            if history is not None:
+                history.log_eta(tests[i+1:], logger)
+
+    if history is not None:
+        history.save()
+
+    # remove the executables of earlier invocations from the store
+    for entry in prune_store(dir_path(options.workdir)+'.exe_store/'):
+        logger.debug('Removed ' + entry + ' from the executable store')
+
+    # resources used by the model runs
+    log_resources(tests, logger)
+    if options.resources:
+        filename = os.path.join(options.workdir, options.resources)
+        try:
+            write_resources(tests, filename)
+            logger.info('Resources of the model runs written to ' + filename)
+        except (OSError, IOError) as e:
+            logger.warning('Unable to write resources to %s: %s' % (filename, e))
 
     # end of testsuite std output
     logger.important('FINISHED')
 
 
+def abort(signum, frame):
+    """abort the testsuite on SIGINT or SIGTERM (running models are killed on exit)"""
+    sys.exit(128 + signum)
+
+
 if __name__ == "__main__":
-    main()
+    signal.signal(signal.SIGINT, abort)
+    signal.signal(signal.SIGTERM, abort)
+    try:
+        main()
+    finally:
+        supervisor.kill_all()
@@ -4,6 +4,9 @@
 COSMO TECHNICAL TESTSUITE
 
 General purpose script to compare two YUPRTEST output files
+
+The files are read line by line while they are compared, only the current
+lines and the maximum differences of the current timestep are kept in memory.
 """
 
 # built-in modules
@@ -42,8 +45,16 @@ def cmp_(file1,file2, \
 
     
     # open file
-    data1=open(file1).readlines()
-    data2=open(file2).readlines()
+    data1=Lines(file1)
+    data2=Lines(file2)
+    try:
+        return _compare(file1, file2, data1, data2, v_level, minval, nts, tol_ts, tol_as)
+    finally:
+        data1.close()
+        data2.close()
+
+
+def _compare(file1, file2, data1, data2, v_level, minval, nts, tol_ts, tol_as):
 
     # variables initialisation
     error_count = 0       #number of error detected
@@ -90,17 +101,17 @@ def cmp_(file1,file2, \
     
 
     # check that files are not empty
-    if len(data1)==0:
+    if not data1.has(0):
         print('file ' + file1 + ' is empty!')
         return -1
-    if len(data1)<=4:
+    if not data1.has(4):
         print('file ' + file1 + ' contains only header!')
         return -1
 
-    if len(data2)==0:
+    if not data2.has(0):
         print('file ' + file2 + ' is empty!')
         return -1
-    if len(data2)<=4:
+    if not data2.has(4):
         print('file ' + file2 + ' contains only header!')
         return -1
 
@@ -126,7 +137,7 @@ def cmp_(file1,file2, \
     # Set the file counters to identical time step
     while True:
         #check eof
-        if (i1>=len(data1)) or (i2>=len(data2)):
+        if (not data1.has(i1)) or (not data2.has(i2)):
             print('Files %s and %s do not have overlapping time steps and can not be compared.' %(file1,file2))
             return -1
             
@@ -153,7 +164,7 @@ def cmp_(file1,file2, \
     while True:
        
         #check eof
-        if (i1>=len(data1)) or (i2>=len(data2)):
+        if (not data1.has(i1)) or (not data2.has(i2)):
             leof=True
         #read file
         else:
@@ -316,6 +327,34 @@ def cmp_(file1,file2, \
 
 #----------------------------------------------------------------------------
 # Local functions
+class Lines:
+    """lines of a file which are read on demand, the lines are accessed by their index
+    (in increasing order) and lines before the last accessed one are discarded"""
+
+    def __init__(self, filename):
+        self.file = open(filename)
+        self.first = 0      # index of the first line kept
+        self.lines = []
+
+    def has(self, i):
+        """check whether the file has a line with index i"""
+        while self.first + len(self.lines) <= i:
+            line = self.file.readline()
+            if not line:
+                return False
+            self.lines.append(line)
+        return True
+
+    def __getitem__(self, i):
+        if i < self.first or not self.has(i):
+            raise IndexError('list index out of range')
+        del self.lines[:i - self.first]
+        self.first = i
+        return self.lines[0]
+
+    def close(self):
+        self.file.close()
+
 def is_num(x):
     test=True
     try:
@@ -3,14 +3,24 @@ class DefaultValues:
     
     nprocs   = 16
     nprocio  = None
+    jobs     = None
+    cores    = None
+    check_jobs = 2
+    checker_threads = 4
     v_level  = 1
     mpicmd   = "aprun -n"
     exe      = None
+    copy_exe = False
     steps    = None
     stdout   = ""
     testlist = "testlist.xml"
     tolerance = "TOLERANCE"
     timeout  = None
+    history  = "ts_history.json"
+    resources = ""
+    cache    = ""
+    yu_cache = "ts_yucache"
+    share_runs = False
     forcematch = False
     forcematch_base = False
     tune_thresholds = False
@@ -121,6 +121,11 @@ class WarningPattern(Pattern):
     def pattern_no_match(self):
         return self._check_match()
 
+class CrashPattern(ErrorPattern):
+    """will return crash code if it gets matched, MATCH if it doesn't"""
+    def _check_failed(self):
+        return 30
+
 class OccurrenceCrashPattern(OccurrencePattern):
     """will return crash code if this pattern is not found"""
     def _check_failed(self):
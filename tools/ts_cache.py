@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+This module implements a cache of the results of model runs. The key of a run is a
+hash of everything which determines its outcome: the executable, the content of the
+run directory after the preparation of the test (namelists, auxiliary files and
+restart files), the input directory it links to, the number of processors and the
+arguments. On a hit the stored outputs are copied back into the run directory and
+the model does not have to be run again, only the checkers are called.
+
+The same keys are used to share model runs between tests of a single invocation of
+the testsuite which only differ in their checkers (see SharedRuns).
+
+cache = ResultCache('work/cache')
+key = run_key(test)                # key of the model run of a prepared test
+if not cache.restore(key, rundir): # copy outputs to the run directory if available
+    ...                            # run the model
+    cache.store(key, rundir)       # store outputs of a successful run
+
+The cache is optional, both methods raise OSError if the cache cannot be accessed and
+the caller continues without it (an entry is created by renaming a temporary directory,
+so partially written entries are never used).
+"""
+
+# built-in modules
+import os, glob, shutil, hashlib, threading
+
+# private modules
+from ts_utilities import file_hash, copy_file, copy_tree
+
+# information
+__author__     = "Oliver Fuhrer, Xavier Lapillonne"
+__email__      = "cosmo-wg6@cosmo.org"
+__maintainer__ = "xavier.lapillonne@meteoswiss.ch"
+
+# version of the format of the keys (increase to invalidate all entries)
+CACHE_VERSION = '1'
+
+
+def run_key(test):
+    """return the key of the model run of a test (after prepare() and prerun())"""
+
+    h = hashlib.sha1()
+    h.update(CACHE_VERSION.encode())
+    h.update(file_hash(test.basedir + test.executable).encode())
+    h.update(repr((test.nprocs, test.options.args, test.options.mpicmd,
+                   test.options.use_wrappers)).encode())
+    _hash_tree(h, test.rundir, exclude=[test.executable])
+    return h.hexdigest()
+
+
+def _hash_tree(h, directory, exclude=[]):
+    """hash the content of all files of a directory, linked directories (e.g. input data)
+    are hashed by the names, sizes and modification times of their files"""
+
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        relroot = os.path.relpath(root, directory)
+        for name in list(dirs):
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                dirs.remove(name)
+                h.update(('link ' + os.path.join(relroot, name) + ' ' + os.path.realpath(path) + '\n').encode())
+                _hash_stats(h, path)
+        for name in sorted(files):
+            if relroot == '.' and name in exclude:
+                continue
+            path = os.path.join(root, name)
+            if os.path.exists(path):
+                h.update(('file ' + os.path.join(relroot, name) + ' ' + file_hash(path) + '\n').encode())
+            else:
+                # dangling link
+                h.update(('link ' + os.path.join(relroot, name) + ' ' + os.readlink(path) + '\n').encode())
+
+
+def _hash_stats(h, directory):
+    for root, dirs, files in os.walk(directory, followlinks=True):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            h.update(('stat ' + os.path.relpath(path, directory) + ' %d %d\n' % (st.st_size, st.st_mtime_ns)).encode())
+
+
+class ResultCache:
+    """store of the outputs of model runs indexed by a hash of their inputs"""
+
+    def __init__(self, directory):
+        self.directory = directory      # directory containing one subdirectory per entry
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        """return the directory of an entry"""
+        return os.path.join(self.directory, key)
+
+    def restore(self, key, rundir):
+        """copy the outputs of a cached run into rundir, return False if there is no entry
+        (raises OSError if the entry cannot be copied)"""
+
+        entry = self.path(key)
+        if not os.path.isdir(entry):
+            return False
+        copy_tree(entry, rundir)
+        return True
+
+    def store(self, key, rundir):
+        """store the outputs of a run (raises OSError if the entry cannot be written)"""
+
+        entry = self.path(key)
+        if os.path.isdir(entry):
+            return
+        tmpdir = '%s.tmp.%d.%d' % (entry, os.getpid(), threading.get_ident())
+        try:
+            if os.path.isdir(tmpdir):
+                shutil.rmtree(tmpdir)
+            os.makedirs(tmpdir)
+            copy_outputs(rundir, tmpdir)
+            with self.lock:
+                if os.path.isdir(entry):
+                    shutil.rmtree(tmpdir)
+                else:
+                    os.rename(tmpdir, entry)
+        except OSError:
+            # remove the partially written entry
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            raise
+
+
+class SharedRuns:
+    """model runs of the current invocation of the testsuite which are shared between tests
+
+    Tests whose model runs have the same key produce identical outputs, only the first
+    of them runs the model and the others copy its outputs. A test which uses a run with
+    the same key as reference or depends on it always runs the model itself (e.g. to
+    check reproducibility)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.runs = {}                  # key -> list of [test, finished event, success]
+
+    def acquire(self, key, test):
+        """return a test whose successful model run test can reuse (waits until it has finished),
+        or None if test has to run its model itself. In both cases release() has to be called
+        once the outputs are available in the run directory of test."""
+
+        with self.lock:
+            runs = self.runs.setdefault(key, [])
+            candidates = list(runs)
+            if not all([self.__may_share(test, run[0]) for run in runs]):
+                # the reference of test has the same configuration, test has to run the model
+                # itself (e.g. to check reproducibility), other tests may share this run later on
+                candidates = []
+            runs.append([test, threading.Event(), False])
+
+        for (other, finished, success) in candidates:
+            finished.wait()
+        with self.lock:
+            for run in candidates:
+                if run[2]:
+                    return run[0]
+        # no run or all runs have failed
+        return None
+
+    def release(self, key, test, success):
+        """signal that the model run of test has finished"""
+
+        with self.lock:
+            for run in self.runs.get(key, []):
+                if run[0] is test:
+                    run[2] = success
+                    run[1].set()
+
+    @staticmethod
+    def __may_share(test, other):
+        """check whether test may reuse the run of other (other is no reference of test)"""
+
+        if other is test:
+            return False
+        rundir = os.path.normpath(other.rundir)
+        if os.path.normpath(test.refoutdir) == rundir:
+            return False
+        if test.dependdir is not None and os.path.normpath(os.path.join(test.rundir, test.dependdir)) == rundir:
+            return False
+        return True
+
+
+def copy_outputs(src, dst):
+    """copy the outputs of a model run (exe.log, YU* and output/) from directory src to dst"""
+
+    for pattern in ['exe.log', 'YU*', 'output']:
+        for path in glob.glob(os.path.join(src, pattern)):
+            if os.path.isdir(path):
+                copy_tree(path, os.path.join(dst, os.path.basename(path)))
+            else:
+                copy_file(path, dst)
+
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+This module calls the checkers of a test. Checkers written in Python which provide a
+check(context) function are imported once and called in-process. The context is a
+dictionary with the TS_* variables which are passed as environment variables to all
+other checkers (e.g. shell or Ruby scripts), these are run as separate processes.
+
+status, output = call_checker('tolerance_check.py', checker_environ(test), logger)
+"""
+
+# built-in modules
+import os, sys, io, threading, traceback, importlib.util
+
+# private modules
+from ts_utilities import system_command
+
+# information
+__author__     = "Oliver Fuhrer, Xavier Lapillonne"
+__email__      = "cosmo-wg6@cosmo.org"
+__maintainer__ = "xavier.lapillonne@meteoswiss.ch"
+
+# directory containing the checkers
+checkerdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../checkers/")
+
+
+class ThreadLocalStdout:
+    """replacement of sys.stdout which redirects the output of a thread into a buffer"""
+
+    def __init__(self, stream):
+        self.stream = stream            # original stdout
+        self.local = threading.local()
+
+    def capture(self):
+        """redirect the output of the calling thread into a new buffer"""
+        self.local.buffer = io.StringIO()
+
+    def release(self):
+        """stop redirecting the output of the calling thread and return it"""
+        output = self.local.buffer.getvalue()
+        self.local.buffer = None
+        return output
+
+    def __target(self):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            return self.stream
+        return buffer
+
+    def write(self, text):
+        return self.__target().write(text)
+
+    def flush(self):
+        self.__target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+_lock = threading.Lock()
+_modules = {}      # checker -> imported module (or None if not a Python checker)
+_stdout = None
+
+
+def load_checker(checker):
+    """return the module of a Python checker providing check(context) or None"""
+
+    with _lock:
+        if checker not in _modules:
+            module = None
+            if checker.endswith('.py'):
+                spec = importlib.util.spec_from_file_location(
+                    'checker_' + checker[:-3], os.path.join(checkerdir, checker))
+                module = importlib.util.module_from_spec(spec)
+                try:
+                    spec.loader.exec_module(module)
+                except (SyntaxError, ImportError, OSError):
+                    module = None   # e.g. requires another interpreter, run as a separate process
+                if not callable(getattr(module, 'check', None)):
+                    module = None
+            _modules[checker] = module
+        return _modules[checker]
+
+
+def _capture_stdout():
+    """install a thread-local stdout (unless done before) and start capturing the output of this thread"""
+
+    global _stdout
+    with _lock:
+        if sys.stdout is not _stdout:
+            _stdout = ThreadLocalStdout(sys.stdout)
+            sys.stdout = _stdout
+    _stdout.capture()
+    return _stdout
+
+
+def call_checker(checker, context, logger, cwd=None):
+    """call a checker and return its result and output"""
+
+    module = load_checker(checker)
+
+    if module is None:
+        # run checker as a separate process with the context in the environment
+        env = dict(os.environ)
+        env.update(context)
+        return system_command([os.path.join(checkerdir, checker)], logger, return_output=True,
+                              throw_exception=False, issue_error=False, cwd=cwd, env=env)
+
+    stdout = _capture_stdout()
+    try:
+        status = module.check(context)
+    except Exception:
+        traceback.print_exc(file=sys.stdout)
+        status = 30 # CRASH
+    finally:
+        output = stdout.release()
+
+    return status, output
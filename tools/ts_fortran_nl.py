@@ -4,10 +4,28 @@
 COSMO TECHNICAL TESTSUITE
 
 Various tools used to read and modify fortran namelists
+
+nl = Namelist('INPUT_ORG')               # parse namelist file once
+nl.get('dt')                             # value of a parameter ('' if not present)
+nl.get('runctl:dt')                      # value of a parameter of a given group
+nl.values('ncomb')                       # values as Python objects (e.g. [0, 10, 1])
+nl.set('nstop', ' nstop=10', occurrence=1) # modify a parameter in memory
+nl.write()                               # write file back (only if modified)
+
+Namelists are split into tokens (group headers, names, values, strings, comments...)
+in a single pass over the whole file, so that values spanning several lines, repeat
+counts (3*0.0) and exponents (1.0d-3) are recognized and each assignment is known
+to belong to a group. Modifications only replace the text of the assignment itself,
+comments and formatting of the rest of the file are kept.
+
+Parsed namelist files are cached for the whole process and keyed by their path, so
+repeated lookups (e.g. get_param in the checkers) do not read and parse the file
+again. An entry is only used as long as the modification time and size of the file
+have not changed (files which have been modified recently are compared by content).
 """
 
 # built-in modules
-import os, sys, re
+import os, sys, re, time, threading, collections
 from ts_error import StopError, SkipError
 
 # information
@@ -16,6 +34,7 @@ __email__      = "cosmo-wg6@cosmo.org"
 __maintainer__ = "xavier.lapillonne@meteoswiss.ch"
 
 
+# line based pattern of an assignment (only used for get_param with ignore_comments=False)
 namelist_pattern=re.compile(
     r""" ( (?P<varname> [a-zA-Z]\w*)[ ]* = [ ]*                    # this reads the variable name part, it has to start
                                                                    # with a letter and can have one single space before '='
@@ -26,98 +45,365 @@ namelist_pattern=re.compile(
       [ ]? ,?) """, re.VERBOSE )
 
 
+# elements of the syntax of Fortran namelists
+_gap = r"(?:\s|![^\n]*(?![^\n]))*"                              # blanks and comments (until end of line)
+_name = r"[a-zA-Z]\w*(?:[ ]*\([^()=]*\))?(?:%[a-zA-Z]\w*)*"     # name (with subscript or component)
+_item = (r"(?:'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\""                 # a single value: character constant,
+         r"|[^\s,/!'\"=&$]+(?![^\s,/!'\"=&$]|\s*=))")              # number, logical... (but not a name)
+
+# tokens of a namelist (blanks, comments and separators in front of them are skipped), a whole
+# assignment including the list of its values (which may span several lines) is a single token
+# such that a namelist is parsed in a single pass with few tokens
+token_pattern = re.compile(
+    r"(?:\s+|![^\n]*|,)*"
+    r"(?:(?P<group>[&$][a-zA-Z]\w*)"                              # start of a group (or &end)
+    r"|(?P<end>/)"                                                # end of a group
+    r"|(?P<name>" + _name + r")\s*=[ \t]*"                        # assignment
+    r"(?P<value>(?:,[ \t]*)*" + _item + r"(?:(?:" + _gap + r",)*" + _gap + _item + r")*)?"
+    r"|(?P<other>.))", re.DOTALL)
+
+# single values, separators and comments of the value of an assignment
+value_pattern = re.compile(
+    r"""(?P<comment>![^\n]*)|(?P<comma>,)|(?P<space>\s+)"""
+    r"""|(?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")|(?P<value>[^\s,!'"]+|.)""", re.DOTALL)
+
+# numbers with a d exponent (character constants are matched to skip them)
+exponent_pattern = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")"""
+                              r"""|(?<![\w.])([-+]?(?:\d+\.?\d*|\.\d+))[dD]([-+]?\d+)(?![\w.])""")
+
+repeat_pattern = re.compile(r'^(\d+)\*(.*)$')
+separator_pattern = re.compile(r'[ \t]*,')
+
+# assignment of a namelist: group and name (lower case), offset of the name, offsets of the
+# value (from the first to the last value) and the text of the value (without comments)
+Assignment = collections.namedtuple('Assignment', ['group', 'name', 'start', 'vstart', 'vend', 'value'])
+
+
+def _join_lines(value):
+    """remove comments from a value spanning several lines and join the lines"""
+    tokens = [m.group() for m in value_pattern.finditer(value) if m.lastgroup != 'comment']
+    return re.sub(r'[ \t]*\n\s*', ' ', ''.join(tokens))
+
+
+def _replace_exponent(m):
+    if m.group(1) is not None:
+        return m.group()
+    if int(m.group(3)) == 0:
+        return m.group(2)
+    return m.group(2) + 'e' + m.group(3)
+
+
+def _normalize_exponents(value):
+    """replace d exponents of numbers by e exponents such that the values can be converted
+    by float() (an exponent 0 is removed, e.g. 1.0d0 becomes 1.0)"""
+    return exponent_pattern.sub(_replace_exponent, value)
+
+
+def parse(text):
+    """return the assignments of a namelist text (linear in the length of the text)"""
+
+    assignments = []
+    group = None
+    for m in token_pattern.finditer(text):
+        name = m.group('name')
+        if name is not None:
+            value = m.group('value')
+            if value is None:
+                value = ''
+                vstart = vend = m.end()
+            else:
+                vstart, vend = m.span('value')
+                if '\n' in value or '!' in value:
+                    value = _join_lines(value)
+                if 'd' in value or 'D' in value:
+                    value = _normalize_exponents(value)
+            if ' ' in name or not name.islower():
+                name = name.replace(' ', '').lower()
+            assignments.append(Assignment(group, name, m.start('name'), vstart, vend, value))
+        elif m.group('group') is not None:
+            group = m.group('group')[1:].lower()
+            if group == 'end':
+                group = None
+        elif m.group('end') is not None:
+            group = None
+
+    return tuple(assignments)
+
+
+def split_param(param):
+    """split a parameter of the form [group:]name into group (None if not given) and name"""
+    if ':' in param:
+        group, name = param.split(':', 1)
+        return group.strip().lower(), name.strip().lower()
+    return None, param.strip().lower()
+
+
+def find_index(assignments, param, occurrence=1):
+    """return the index of an occurrence of a parameter (of the form [group:]name) or None"""
+
+    group, name = split_param(param)
+    count = 0
+    for i, assignment in enumerate(assignments):
+        if assignment.name == name and (group is None or assignment.group == group):
+            count += 1
+            if count == occurrence:
+                return i
+    return None
+
+
+def find_param(assignments, param, occurrence=1):
+    """return an occurrence of a parameter (of the form [group:]name) or None"""
+
+    i = find_index(assignments, param, occurrence)
+    if i is None:
+        return None
+    return assignments[i]
+
+
+def convert_value(token):
+    """convert a single value of a namelist to a Python object"""
+
+    if token[:1] in ['"', "'"]:
+        return token[1:-1].replace(token[0]*2, token[0])
+    if re.match(r'^\.?[tTfF]', token):
+        return token.lstrip('.')[0] in 'tT'
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token.replace('d', 'e').replace('D', 'E'))
+    except ValueError:
+        return token
+
+
+def convert_values(text):
+    """convert the value of an assignment to a list of Python objects, repeat counts
+    are expanded and null values are returned as None"""
+
+    values = []
+    repeat = None
+    expect = True       # a value is expected (at the start and after a separator)
+    for m in value_pattern.finditer(text):
+        kind = m.lastgroup
+        token = m.group()
+        if kind == 'comma':
+            if expect:
+                values += [None] * (repeat or 1)
+            repeat = None
+            expect = True
+        elif kind in ['string', 'value']:
+            r = repeat_pattern.match(token) if kind == 'value' else None
+            if r is not None:
+                repeat = int(r.group(1))
+                if r.group(2) == '':
+                    continue    # null values or value of another token (e.g. 2*'abc')
+                token = r.group(2)
+            values += [convert_value(token)] * (repeat or 1)
+            repeat = None
+            expect = False
+    if repeat is not None:
+        values += [None] * repeat
+    return values
+
+
+_cache = {}        # absolute path -> (stat key, time of caching, text, assignments)
+_cache_lock = threading.Lock()
+
+# files modified less than this before being cached may be modified again without a visible change
+# of their modification time (coarse timestamps), their entries are verified against the content
+RACY_NS = 2000000000
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _store(path, key, stamp, text, assignments):
+    with _cache_lock:
+        _cache[path] = (key, stamp, text, assignments)
+
+
+def parse_file(filename):
+    """return the text of a namelist file and its assignments, the result is cached
+    as long as the file is not modified (raises OSError)"""
+
+    path = os.path.abspath(filename)
+    stamp = int(time.time() * 1e9)
+    key = _stat_key(path)
+    with _cache_lock:
+        entry = _cache.get(path)
+
+    if entry is not None and entry[0] == key and key[0] < entry[1] - RACY_NS:
+        return entry[2], entry[3]
+
+    with open(path) as f:
+        text = f.read()
+    if entry is not None and entry[0] == key and entry[2] == text:
+        # unchanged, the entry can be trusted from now on if the file is old enough
+        _store(path, key, stamp, text, entry[3])
+        return text, entry[3]
+
+    assignments = parse(text)
+    _store(path, key, stamp, text, assignments)
+    return text, assignments
+
+
+def _prime_cache(filename, text, assignments):
+    """store the content of a namelist file which has just been written"""
+    path = os.path.abspath(filename)
+    try:
+        key = _stat_key(path)
+    except OSError:
+        return
+    _store(path, key, int(time.time() * 1e9), text, assignments)
+
+
+def clear_cache():
+    """drop all parsed namelist files"""
+    with _cache_lock:
+        _cache.clear()
+
+
 def get_param(filename, param, ignore_comments=True, occurrence=1):
-    """retrieve a parameter from a Fortran namelist file"""
+    """retrieve a parameter (of the form [group:]name) from a Fortran namelist file"""
+
+    if ignore_comments:
+        try:
+            text, assignments = parse_file(filename)
+        except (OSError, IOError):
+            raise SkipError('get_param: Error while opening '+filename)
+        assignment = find_param(assignments, param, occurrence)
+        if assignment is None:
+            return ''
+        return assignment.value
 
     comt = '!' # the comment character
-    foundparam = False
     zcount = 0
- 
+
     try:
         data = open(filename).readlines()
     except :
         raise SkipError('get_param: Error while opening '+filename)
 
     for line in data:
+        line = line.replace(comt,' ')
 
-        # remove comment if required
-        if ignore_comments:
-            i_cmt = line.find(comt)
-            if i_cmt > -1: line = line[0:i_cmt]
-        else:
-            line = line.replace(comt,' ')
-            
         # search for  patterns, i.e. assignements
-        matchobj = re.finditer(namelist_pattern,line)
-        if matchobj is None:
-            continue
-        for assignement in matchobj:
+        for assignement in re.finditer(namelist_pattern,line):
             if assignement.group('varname') == param:
                 zcount += 1
                 if zcount == occurrence:
                     return assignement.group('arg')
 
-    return ''     
+    return ''
 
 
 def replace_param(filename, param, newparamstr, occurrence=1):
     """replace a namelist parameter in a Fortran namelist file"""
 
-    comt = '!' # the comment character
-    istatus = -1
-    ierr = 0
-    occ_counter = 0
-    possible = False
-
-    # check that newparamstr is of the form  param2 = val2    
-    if not '=' in newparamstr:
-        raise SkipError('replace_param: newparamstr should'
-                        'be a string of the form "param2 = val2" ')
- 
-    # open file if exists
-    try:
-        data = open(filename).readlines()
-    except:
-        raise SkipError('replace_param: Error while opening '+filename)
+    nl = Namelist(filename)
+    nl.set(param, newparamstr, occurrence=occurrence)
+    nl.write()
 
-    new_data = []
-    
-    for line in data:
 
-        # remove end of line charcater
-        line = line.strip('\n')
-        # separates comments from rest of the line
-        i_cmt = line.find(comt)
-        if i_cmt == -1: i_cmt = len(line) # if no comments on this line
-        line_c = line[i_cmt:]
-        line = line[:i_cmt]
-        
-        # search for attention-relevant patterns, i.e. assignements
-        matchobj = re.finditer(namelist_pattern,line)
-        if matchobj is None:
-            continue
-        for assignement in matchobj:
-            if assignement.group('varname') == param:
-                # change the entige group with the newparamstring
-                occ_counter += 1
-                
-                if occ_counter == occurrence:
-                    line = line.replace(assignement.group(),newparamstr+',')
-                    modification = True
-                    possible = True
-        
-        new_data.append(line+line_c+'\n')
-                             
-    fout = open(filename,'w')
-    fout.write(''.join(new_data))
-    fout.close
-
-    # if no return has been so far executed the code will have no significance any more
-    if not possible:
-        raise SkipError('replace_param: unable to successfully modify parameter '+param+' into '+newparamstr)
-
-    if not modification:
-        raise SkipError('replace_param: unable to successfully modify the '+occurrence+
-                        'th occurrence of parameter '+param+' into '+newparamstr)
+class Namelist:
+    """in-memory representation of a Fortran namelist file which is parsed once and written
+    back once after all modifications (parameters are of the form [group:]name)
+
+    If source is given, the content is taken from this file instead (which has to be
+    identical to filename, e.g. the original of a copy) such that a file shared by
+    several tests is only parsed once."""
+
+    def __init__(self, filename, source=None):
+        self.filename = filename
+        if source is None or not os.path.isfile(source):
+            source = filename
+        try:
+            self.text, self._assignments = parse_file(source)
+        except (OSError, IOError):
+            raise SkipError('Namelist: Error while opening '+filename)
+        # offsets of the assignments are moved lazily after modifications: the assignments
+        # from index i on are moved by delta for each [i, delta]
+        self._shifts = []
+        self.modified = False
+
+    @property
+    def assignments(self):
+        """assignments of the current text (see parse())"""
+        if self._shifts:
+            self._assignments = tuple([Assignment(a.group, a.name, a.start + d, a.vstart + d, a.vend + d, a.value)
+                                       for a, d in zip(self._assignments, self.__deltas())])
+            self._shifts = []
+        return self._assignments
+
+    def __deltas(self):
+        """return the shift of the offsets of each assignment"""
+        deltas = [0] * (len(self._assignments) + 1)
+        for i, delta in self._shifts:
+            deltas[i] += delta
+        for i in range(1, len(deltas)):
+            deltas[i] += deltas[i-1]
+        return deltas
+
+    def __shift(self, i):
+        """return the shift of the offsets of the assignment with index i"""
+        return sum([delta for j, delta in self._shifts if j <= i])
+
+    def get(self, param, occurrence=1):
+        """retrieve a parameter ('' if the parameter is not present)"""
+        assignment = find_param(self._assignments, param, occurrence)
+        if assignment is None:
+            return ''
+        return assignment.value
+
+    def values(self, param, occurrence=1):
+        """retrieve the values of a parameter as a list of Python objects (None if not present)"""
+        assignment = find_param(self._assignments, param, occurrence)
+        if assignment is None:
+            return None
+        return convert_values(assignment.value)
+
+    def set(self, param, newparamstr, occurrence=1):
+        """replace a parameter by newparamstr (of the form "param2 = val2")"""
+
+        if not '=' in newparamstr:
+            raise SkipError('replace_param: newparamstr should'
+                            'be a string of the form "param2 = val2" ')
+
+        i = find_index(self._assignments, param, occurrence)
+        if i is None:
+            raise SkipError('replace_param: unable to successfully modify parameter '+param+' into '+newparamstr)
+        assignment = self._assignments[i]
+        shift = self.__shift(i)
+
+        # replace the assignment including the separator following it (values on
+        # continuation lines are removed as well)
+        start = assignment.start + shift
+        end = assignment.vend + shift
+        m = separator_pattern.match(self.text, end)
+        if m is not None:
+            end = m.end()
+        replacement = newparamstr + ','
+        self.text = self.text[:start] + replacement + self.text[end:]
 
+        # only the replacement is parsed (its offsets are stored like those of the assignment
+        # it replaces), the offsets of the following assignments are moved lazily
+        offset = start - shift
+        new = tuple([Assignment(a.group or assignment.group, a.name, a.start + offset, a.vstart + offset,
+                                a.vend + offset, a.value) for a in parse(replacement)])
+        self._assignments = self._assignments[:i] + new + self._assignments[i+1:]
+        self._shifts = [[j + len(new) - 1 if j > i else j, delta] for j, delta in self._shifts]
+        self._shifts.append([i + len(new), len(replacement) - (end - start)])
+        self.modified = True
 
+    def write(self):
+        """write the namelist back to file if it has been modified"""
+        if self.modified:
+            if not self.text.endswith('\n'):
+                self.text += '\n'
+            with open(self.filename, 'w') as f:
+                f.write(self.text)
+            _prime_cache(self.filename, self.text, self.assignments)
+            self.modified = False
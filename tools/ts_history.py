@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+This module implements a persistent store of the runtimes of the tests. For every
+test the time spent in the prepare, run and check phases is stored in a JSON file
+in the working directory. Entries are keyed by the test (type/name), the hash of
+the executable, the number of processors and the number of steps, such that only
+comparable runs are used for estimates. The peak memory of the model runs is stored
+along with the timings to detect tests whose memory usage has regressed.
+
+h = RuntimeHistory('work/ts_history.json')
+h.estimate(test)         # expected runtime (in s) of a test or None if unknown
+h.eta(tests, 4)          # expected time to run a list of tests with 4 concurrent jobs
+h.log_eta(tests, logger) # print the expected time to run a list of tests
+h.record(test)           # store the timings of a test which has finished
+h.save()                 # write history back to file
+"""
+
+# built-in modules
+import os, json, threading
+
+# private modules
+from ts_utilities import file_hash
+
+# information
+__author__     = "Oliver Fuhrer, Xavier Lapillonne"
+__email__      = "cosmo-wg6@cosmo.org"
+__maintainer__ = "xavier.lapillonne@meteoswiss.ch"
+
+
+class RuntimeHistory:
+    """persistent store of the timings of the phases of all tests"""
+
+    phases = ['prepare', 'run', 'check']
+
+    def __init__(self, filename, max_entries=10, regression_factor=1.5, regression_min=10.0, memory_min=64.0):
+        self.filename = filename                    # file where the history is stored
+        self.max_entries = max_entries              # number of runs retained per test
+        self.regression_factor = regression_factor  # relative slowdown considered a regression
+        self.regression_min = regression_min        # minimal slowdown (in s) considered a regression
+        self.memory_min = memory_min                # minimal increase of memory (in MiB) considered a regression
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(filename):
+            try:
+                with open(filename, 'r') as f:
+                    self.entries = json.load(f)
+            except (IOError, ValueError):
+                self.entries = {}
+
+    def key(self, test):
+        """return the key under which the timings of a test are stored"""
+        exe = test.basedir + test.executable
+        if os.path.exists(exe):
+            exe_hash = file_hash(exe)
+        else:
+            exe_hash = 'none'
+        return '{0}/{1}:{2}:{3}:{4}'.format(test.type, test.name, exe_hash, test.nprocs, test.options.steps)
+
+    def estimate(self, test, default=None):
+        """return the expected runtime (sum of all phases) of a test"""
+        with self.lock:
+            entries = self.entries.get(self.key(test), [])
+        if not entries:
+            return default
+        totals = sorted([sum([entry.get(phase, 0.0) for phase in self.phases]) for entry in entries])
+        return totals[len(totals)//2] # median
+
+    def eta(self, tests, jobs=1):
+        """return the expected time to run a list of tests (tests without history are ignored)"""
+        estimates = [self.estimate(test) for test in tests]
+        estimates = [x for x in estimates if x is not None]
+        if not estimates:
+            return None
+        return max(max(estimates), sum(estimates) / max(1, min(jobs, len(estimates))))
+
+    def log_eta(self, tests, logger, jobs=1):
+        """print the expected time to run the remaining tests"""
+        eta = self.eta(tests, jobs)
+        if eta is not None:
+            logger.info('{0} tests remaining, estimated time {1:.0f} s'.format(len(tests), eta))
+
+    def record(self, test):
+        """store the timings of a test and warn if its runtime or memory usage has regressed"""
+
+        if 'run' not in test.timings:
+            return
+        total = sum([test.timings.get(phase, 0.0) for phase in self.phases])
+        expected = self.estimate(test)
+        if expected is not None and total > self.regression_factor * expected \
+                                and total - expected > self.regression_min:
+            test.logger.warning('Runtime of test {0}/{1} has regressed ({2:.1f} s, history {3:.1f} s)'.format(
+                test.type, test.name, total, expected))
+
+        entry = dict(test.timings)
+        key = self.key(test)
+        if test.resources is not None:
+            entry['maxrss'] = test.resources['maxrss']
+            with self.lock:
+                memory = sorted([e['maxrss'] for e in self.entries.get(key, []) if 'maxrss' in e])
+            if memory:
+                expected = memory[len(memory)//2] # median
+                if entry['maxrss'] > self.regression_factor * expected and \
+                   entry['maxrss'] - expected > self.memory_min:
+                    test.logger.warning('Memory usage of test {0}/{1} has regressed ({2:.1f} MiB, history {3:.1f} MiB)'.format(
+                        test.type, test.name, entry['maxrss'], expected))
+
+        with self.lock:
+            entries = self.entries.setdefault(key, [])
+            entries.append(entry)
+            del entries[:-self.max_entries]
+
+    def save(self):
+        """write history to file"""
+        with self.lock:
+            tmpfile = self.filename + '.tmp'
+            with open(tmpfile, 'w') as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.rename(tmpfile, self.filename)
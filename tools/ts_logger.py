@@ -9,7 +9,7 @@ levels are supported: DEBUG, INFO, WARNING, ERROR
 """
 
 # built-in modules
-import sys, string
+import sys, string, threading
 import logging as LG
 
 # private modules
@@ -132,3 +132,57 @@ class Logger:
     def flush(self):
         self.handler.flush()
 
+
+class BufferedLogger:
+    """logger proxy which holds back all messages of a test until flush() is called,
+    this keeps the output of tests running concurrently together"""
+
+    lock = threading.Lock() # serializes the flushing of the different buffers
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.color = logger.color
+        self.records = []
+
+    def __record(self, method, msg, *args, **kwargs):
+        self.records.append((method, (msg,) + args, kwargs))
+
+    def setLevel(self, lvl):
+        self.logger.setLevel(lvl)
+
+    def log(self, lvl, msg, *args, **kwargs):
+        self.__record('log', lvl, msg, *args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        self.__record('debug', msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.__record('info', msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.__record('warning', msg, *args, **kwargs)
+
+    def chckinfo(self, msg, *args, **kwargs):
+        self.__record('chckinfo', msg, *args, **kwargs)
+
+    def important(self, msg, *args, **kwargs):
+        self.__record('important', msg, *args, **kwargs)
+
+    def result(self, indent, status, msg, *args, **kwargs):
+        self.__record('result', indent, status, msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self.__record('error', msg, *args, **kwargs)
+
+    def flush(self):
+        """forward all held back messages to the underlying logger"""
+        if isinstance(self.logger, BufferedLogger):
+            # nested buffers are merged into the enclosing buffer
+            records, self.records = self.records, []
+            self.logger.records.extend(records)
+            return
+        with BufferedLogger.lock:
+            records, self.records = self.records, []
+            for (method, args, kwargs) in records:
+                getattr(self.logger, method)(*args, **kwargs)
+            self.logger.flush()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+This module implements a watcher which follows the log file of a running model and
+searches each new line for crash patterns (e.g. the message printed by model_abort).
+The supervisor polls the watcher of a job while it is running and terminates the job
+as soon as a crash pattern has been found, instead of waiting for the timeout.
+
+watcher = LogWatcher(rundir+'exe.log', [CrashPattern('abort', 'PROGRAM TERMINATED')])
+match = watcher.poll()   # LogMatch(pattern, lineno, line) or None
+"""
+
+# built-in modules
+import re
+from collections import namedtuple
+
+# private modules
+from filechecker import CrashPattern
+
+# information
+__author__     = "Oliver Fuhrer, Xavier Lapillonne"
+__email__      = "cosmo-wg6@cosmo.org"
+__maintainer__ = "xavier.lapillonne@meteoswiss.ch"
+
+# patterns indicating that the model has crashed (used if the configuration file does not
+# define crash_patterns)
+crash_patterns = [
+    'PROGRAM TERMINATED BECAUSE OF ERRORS',    # model_abort of COSMO
+    'MPI_ABORT was invoked',                   # Open MPI
+    'forrtl: severe',                          # Intel Fortran runtime
+    'Program received signal SIG',             # GNU Fortran backtrace
+]
+
+# first line of the log matching a crash pattern
+LogMatch = namedtuple('LogMatch', ['pattern', 'lineno', 'line'])
+
+
+def make_patterns(regexes):
+    """return the crash patterns for a list of regular expressions"""
+    return [CrashPattern(regex, regex) for regex in regexes]
+
+
+class LogWatcher:
+    """follows a log file which is being written and searches its lines for crash patterns"""
+
+    def __init__(self, filename, patterns, max_line=65536):
+        self.filename = filename        # log file (may not exist yet)
+        self.patterns = [(pattern, re.compile(pattern.search_pattern)) for pattern in patterns]
+        self.max_line = max_line        # longer lines are searched in pieces
+        self.file = None
+        self.partial = b''              # incomplete last line
+        self.lineno = 0
+        self.match = None
+
+    def poll(self, final=False):
+        """search the lines written since the last call (including an incomplete last line if
+        final is True), return the first match found so far or None"""
+
+        if self.match is not None or not self.patterns:
+            return self.match
+        if self.file is None:
+            try:
+                self.file = open(self.filename, 'rb')
+            except (OSError, IOError):
+                return None
+
+        data = self.partial + self.file.read()
+        lines = data.split(b'\n')
+        self.partial = lines.pop()
+        if final or len(self.partial) > self.max_line:
+            lines.append(self.partial)
+            self.partial = b''
+        for line in lines:
+            self.lineno += 1
+            text = line.decode('utf-8', 'replace').rstrip()
+            for pattern, regex in self.patterns:
+                if regex.search(text):
+                    self.match = LogMatch(pattern.description, self.lineno, text)
+                    self.close()
+                    return self.match
+        if final:
+            self.close()
+        return None
+
+    def close(self):
+        """close the log file"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+This module reports the resources used by the model runs of the tests (see
+Job.resources()): wall time, user and system CPU time, peak resident memory of a
+single process and block I/O. The resources are printed as a table at the end of
+the testsuite and can be exported to a CSV file.
+
+log_resources(tests, logger)              # print a table of the resources of all tests
+write_resources(tests, 'work/resources.csv')
+"""
+
+# built-in modules
+import csv
+
+# private modules
+from ts_utilities import status_str
+
+# information
+__author__     = "Oliver Fuhrer, Xavier Lapillonne"
+__email__      = "cosmo-wg6@cosmo.org"
+__maintainer__ = "xavier.lapillonne@meteoswiss.ch"
+
+# fields of the resources in the order they are reported
+FIELDS = ['wall', 'user', 'sys', 'maxrss', 'inblock', 'oublock']
+
+
+def format_resources(resources):
+    """return a one-line description of the resources of a model run"""
+    return 'wall %.2f s, user %.2f s, sys %.2f s, max RSS %.1f MiB, blocks in %d, blocks out %d' % \
+        tuple([resources[field] for field in FIELDS])
+
+
+def log_resources(tests, logger):
+    """print a table of the resources used by the model runs of a list of tests"""
+
+    tests = [test for test in tests if test.resources is not None]
+    if not tests:
+        return
+    logger.info('Resources of the model runs:')
+    logger.info('%-30s %4s %9s %9s %9s %10s %10s %10s' %
+                ('test', 'np', 'wall[s]', 'user[s]', 'sys[s]', 'RSS[MiB]', 'blk in', 'blk out'))
+    for test in tests:
+        res = test.resources
+        logger.info('%-30s %4d %9.2f %9.2f %9.2f %10.1f %10d %10d' %
+                    (test.type + '/' + test.name, test.nprocs, res['wall'], res['user'], res['sys'],
+                     res['maxrss'], res['inblock'], res['oublock']))
+
+
+def write_resources(tests, filename):
+    """write the resources used by the model runs of a list of tests to a CSV file (tests whose
+    model has not been run, e.g. skipped or restored from the cache, have empty fields)"""
+
+    with open(filename, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['type', 'name', 'nprocs', 'result'] + FIELDS)
+        for test in tests:
+            row = [test.type, test.name, test.nprocs, status_str(test.result)]
+            if test.resources is None:
+                row += [''] * len(FIELDS)
+            else:
+                row += [test.resources[field] for field in FIELDS]
+            writer.writerow(row)
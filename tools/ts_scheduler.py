@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+This module implements a scheduler which runs the tests of a testlist concurrently.
+The <depend> elements of the tests define a dependency graph, a test is only started
+once the results of the tests it depends on are known. Independent tests are
+executed concurrently by a pool of workers. If a core budget is given, tests are
+packed according to their number of MPI tasks (largest first) such that the node
+is not oversubscribed, smaller tests are backfilled into the remaining cores.
+If a runtime history is available, the longest tests are started first.
+
+The checks of a test can be pipelined: once the model run of a test has finished
+its cores are released and its checkers are called by a separate (small) pool of
+workers, while the model of the next test is already running.
+
+If a test fails or crashes, all tests depending on it (directly or indirectly) are
+skipped right away. If the testsuite has to stop, the running models are cancelled.
+"""
+
+# built-in modules
+import os
+from concurrent import futures
+
+# private modules
+from ts_logger import BufferedLogger
+from ts_utilities import status_str
+
+# information
+__author__     = "Oliver Fuhrer, Xavier Lapillonne"
+__email__      = "cosmo-wg6@cosmo.org"
+__maintainer__ = "xavier.lapillonne@meteoswiss.ch"
+
+
+class Scheduler:
+    """Runs a list of tests concurrently while respecting the dependencies between them
+
+    The action is called for each test in a separate worker thread, it has to run all
+    phases of the test and return True if the testsuite has to be stopped. If cores is
+    given, the sum of nprocs of the running tests never exceeds this budget (a test
+    requiring more cores than available is run alone). If a history is given, the
+    expected runtimes are used to start the longest tests first and to print an ETA.
+
+    An action may return None to signal that the checks of the test are still pending,
+    in this case check_action is called for the test by a pool of check_jobs workers.
+    Tests depending on it are only started once check_action has returned.
+
+    If given, skip_action(test, reason) is called for the tests depending on a test with
+    a result of FAIL or CRASH instead of running them."""
+
+    def __init__(self, tests, jobs, action, logger, cores=None, history=None,
+                 check_action=None, check_jobs=1, skip_action=None):
+        self.tests = tests              # tests in the order of the testlist
+        self.action = action            # callable which runs a single test
+        self.logger = logger            # logger of the testsuite
+        self.cores = cores              # total number of cores available (None is unlimited)
+        self.history = history          # runtime history of the tests (or None)
+        self.check_action = check_action # callable which calls the checkers of a test
+        self.check_jobs = check_jobs    # number of concurrent checks
+        self.skip_action = skip_action  # callable which skips a single test
+        if jobs is None:
+            jobs = len(tests)
+        self.jobs = max(1, int(jobs))   # maximum number of concurrently running tests
+        self.depends = self.__build_graph()
+        self.estimates = self.__estimate_runtimes()
+        self.finished = set()
+        self.used_cores = 0
+
+    def __build_graph(self):
+        """return a map from each test to the tests (in the testlist) it depends on"""
+
+        rundirs = {}
+        for test in self.tests:
+            rundirs[os.path.normpath(test.rundir)] = test
+
+        depends = {}
+        for test in self.tests:
+            depends[test] = []
+            if test.dependdir is not None:
+                # dependdir is either absolute or relative to the rundir of the test
+                dependdir = os.path.normpath(os.path.join(test.rundir, test.dependdir))
+                if dependdir in rundirs and rundirs[dependdir] is not test:
+                    depends[test].append(rundirs[dependdir])
+                    self.logger.debug('Test {0}/{1} depends on {2}/{3}'.format(test.type, test.name,
+                        rundirs[dependdir].type, rundirs[dependdir].name))
+        return depends
+
+    def __estimate_runtimes(self):
+        """return the expected runtime of each test (tests without history get the median)"""
+
+        estimates = {}
+        if self.history is not None:
+            for test in self.tests:
+                estimates[test] = self.history.estimate(test)
+        known = sorted([x for x in estimates.values() if x is not None])
+        default = known[len(known)//2] if known else 0.0
+        for test in self.tests:
+            if estimates.get(test) is None:
+                estimates[test] = default
+        return estimates
+
+    def __dependents(self, test):
+        """return all tests which depend (directly or indirectly) on test"""
+
+        dependents = []
+        queue = [test]
+        while queue:
+            current = queue.pop(0)
+            for other in self.tests:
+                if current in self.depends[other] and other not in dependents and other is not test:
+                    dependents.append(other)
+                    queue.append(other)
+        return dependents
+
+    def __is_ready(self, test):
+        """check whether the results of all tests this test depends on are known"""
+        return all([dep in self.finished for dep in self.depends[test]])
+
+    def __ready(self, pending, nrunning, nchecking=0):
+        """return the pending tests which can be started now"""
+
+        ready = [test for test in pending if self.__is_ready(test)]
+
+        # in case of a dependency cycle no test can become ready, in this case fall back to
+        # the order of the testlist (prerun() will skip tests with missing results)
+        if not ready and nrunning == 0 and nchecking == 0 and pending:
+            ready = [pending[0]]
+
+        # longest and largest tests first (ties are kept in the order of the testlist)
+        ready = sorted(ready, key=lambda test: (-self.estimates[test], -test.nprocs))
+
+        # pack tests into the free job slots and cores
+        selected = []
+        free_cores = None
+        if self.cores is not None:
+            free_cores = self.cores - self.used_cores
+        for test in ready:
+            if nrunning + len(selected) >= self.jobs:
+                break
+            if free_cores is None or test.nprocs <= free_cores:
+                selected.append(test)
+            elif nrunning == 0 and not selected and test.nprocs > self.cores:
+                # this test does not fit into the core budget at all, run it alone
+                selected.append(test)
+            else:
+                # try to backfill smaller tests into the remaining cores
+                continue
+            if free_cores is not None:
+                free_cores -= test.nprocs
+                if free_cores <= 0:
+                    break
+
+        return selected
+
+    def __execute(self, test):
+        """run a single test with a logger which keeps its output together"""
+
+        test.logger = BufferedLogger(self.logger)
+        result = True
+        try:
+            result = self.action(test)
+        finally:
+            # the output of tests with pending checks is flushed after the checks
+            if result is not None:
+                test.logger.flush()
+        return result
+
+    def __check(self, test):
+        """call the checkers of a test whose model run has finished"""
+
+        try:
+            return self.check_action(test)
+        finally:
+            test.logger.flush()
+
+    def __skip_dependents(self, test, pending):
+        """skip the pending tests depending on a test which has failed or crashed"""
+
+        if self.skip_action is None or test.result < 20:
+            return
+        reason = 'Required test {0}/{1} has status {2}'.format(test.type, test.name, status_str(test.result))
+        for other in self.__dependents(test):
+            if other in pending:
+                pending.remove(other)
+                other.logger = BufferedLogger(self.logger)
+                try:
+                    self.skip_action(other, reason)
+                finally:
+                    other.logger.flush()
+                self.finished.add(other)
+
+    def run(self):
+        """run all tests and return once they have finished (or the testsuite is stopped)"""
+
+        if self.cores is None:
+            self.logger.important('Running tests with {0} concurrent jobs'.format(self.jobs))
+        else:
+            self.logger.important('Running tests with {0} concurrent jobs on {1} cores'.format(self.jobs, self.cores))
+
+        pending = list(self.tests)
+        running = {}    # model runs (future -> test)
+        checking = {}   # checks (future -> test)
+        stop = False
+        aborted = False
+        executor = futures.ThreadPoolExecutor(max_workers=self.jobs)
+        check_executor = futures.ThreadPoolExecutor(max_workers=max(1, self.check_jobs))
+        try:
+            while pending or running or checking:
+
+                # start all tests which are ready
+                if not stop:
+                    for test in self.__ready(pending, len(running), len(checking)):
+                        pending.remove(test)
+                        self.used_cores += test.nprocs
+                        running[executor.submit(self.__execute, test)] = test
+
+                if not running and not checking:
+                    break
+
+                # wait for any of the model runs or checks to finish
+                done, not_done = futures.wait(list(running) + list(checking), return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    if future in running:
+                        # the model run has finished, its cores are available for the next test
+                        test = running.pop(future)
+                        self.used_cores -= test.nprocs
+                        result = future.result()
+                        if result is None:
+                            checking[check_executor.submit(self.__check, test)] = test
+                            continue
+                    else:
+                        test = checking.pop(future)
+                        result = future.result()
+                    self.finished.add(test)
+                    self.__skip_dependents(test, pending)
+                    if result and not stop:
+                        # cancel running models to free the cores
+                        stop = True
+                        for other in running.values():
+                            other.cancel()
+
+                # print estimated time for the remaining tests
+                if self.history is not None and not stop:
+                    self.history.log_eta(pending + list(running.values()), self.logger, self.jobs)
+        except BaseException:
+            # the testsuite is aborted (e.g. SIGINT), running models are cancelled and the
+            # remaining processes are killed on exit (see testsuite.py) without waiting here
+            aborted = True
+            for test in running.values():
+                test.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=not aborted)
+            check_executor.shutdown(wait=not aborted)
+
+        return stop
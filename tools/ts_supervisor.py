@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+This module implements a supervisor for commands which are launched asynchronously
+(e.g. the model runs of the tests). A single background thread polls all running
+commands, enforces their timeout and reaps them once they have finished.
+
+Commands given as list of arguments are started without a shell. Each command runs in
+its own session, on timeout or cancellation all its processes (e.g. the ranks of an
+MPI job) are terminated and killed if they do not exit within a grace period.
+
+If a log watcher is given, the log of the command is searched for crash patterns while it
+is running and the command is terminated as soon as one of them has been found.
+
+The resources used by a command are collected when it is reaped: wall time, user and
+system CPU time, peak resident memory and block I/O of the command and all processes
+it has waited for (e.g. the MPI ranks started by mpirun).
+
+job = supervisor.launch(['mpirun', '-n', '4', './model'], logger, cwd=rundir, timeout=600,
+                        output=rundir+'exe.log')
+... # do something else
+status = supervisor.wait(job)
+job.resources()     # {'wall': 12.3, 'user': 45.6, 'sys': 1.2, 'maxrss': 512.0, ...}
+
+supervisor.kill_all() # terminate all running commands (e.g. when the testsuite is aborted)
+"""
+
+# built-in modules
+import os, sys, time, threading, subprocess, tempfile, signal
+
+# private modules
+from ts_utilities import command_str, signal_process_group, kill_running_commands, KILL_GRACE
+
+# information
+__author__     = "Oliver Fuhrer, Xavier Lapillonne"
+__email__      = "cosmo-wg6@cosmo.org"
+__maintainer__ = "xavier.lapillonne@meteoswiss.ch"
+
+
+class Job:
+    """handle of a command which has been launched asynchronously"""
+
+    def __init__(self, cmd, process, output, logger, timeout=None, log_output=True, watcher=None):
+        self.cmd = cmd                  # command which has been launched
+        self.process = process          # subprocess.Popen object
+        self.output = output            # file receiving stdout/stderr of the command
+        self.log_output = log_output    # log the output once the command has finished
+        self.logger = logger            # logger of the test which launched the command
+        self.timeout = timeout          # timeout in s (or None)
+        self.start_time = time.time()
+        self.end_time = None
+        self.kill_time = None           # time at which the command has been terminated
+        self.timed_out = False
+        self.watcher = watcher          # LogWatcher following the log of the command (or None)
+        self.crash = None               # line of the log matching a crash pattern (LogMatch)
+        self.status = None              # exit status (-2 for timeout, -signal if killed)
+        self.rusage = None              # resource usage of the command once it has been reaped
+        self.finished = threading.Event()
+
+    def done(self):
+        """check whether the command has finished"""
+        return self.finished.is_set()
+
+    def elapsed(self):
+        """return wall time of the command (so far)"""
+        if self.end_time is None:
+            return time.time() - self.start_time
+        return self.end_time - self.start_time
+
+    def resources(self):
+        """return the resources used by the command once it has finished (or None if unknown):
+        wall, user and sys time in s, peak resident memory of a single process in MiB and the
+        number of blocks read and written"""
+
+        if self.rusage is None or self.end_time is None:
+            return None
+        maxrss = self.rusage.ru_maxrss / 1024.0     # in KiB on Linux
+        if sys.platform == 'darwin':
+            maxrss /= 1024.0                        # in bytes on macOS
+        return {'wall': self.elapsed(), 'user': self.rusage.ru_utime, 'sys': self.rusage.ru_stime,
+                'maxrss': maxrss, 'inblock': self.rusage.ru_inblock, 'oublock': self.rusage.ru_oublock}
+
+
+class Supervisor:
+    """polls all running jobs, enforces their timeouts and reaps finished processes"""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval        # polling interval in s
+        self.jobs = []                  # jobs which are running
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def launch(self, cmd, logger, cwd=None, env=None, timeout=None, output=None, watcher=None):
+        """launch a command (a list of arguments or a string executed by the shell) in the
+        background and return its handle, stdout/stderr are written to the file output if given
+        and the command is terminated once watcher finds a crash pattern"""
+
+        logger.debug('SysCmd: '+command_str(cmd))
+        if output is None:
+            output = tempfile.TemporaryFile()
+            log_output = True
+        else:
+            output = open(output, 'wb')
+            log_output = False
+        try:
+            process = subprocess.Popen(cmd, shell=isinstance(cmd, str), stdout=output, stderr=subprocess.STDOUT,
+                                       cwd=cwd, env=env, start_new_session=True)
+        except Exception:
+            output.close()
+            raise
+        if timeout:
+            timeout = int(timeout)
+        job = Job(cmd, process, output, logger, timeout, log_output, watcher)
+
+        with self.lock:
+            self.jobs.append(job)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__poll_loop, name='supervisor')
+                self.thread.daemon = True
+                self.thread.start()
+        return job
+
+    def wait(self, job):
+        """wait for completion of a job and return its exit status"""
+
+        job.finished.wait()
+
+        # log output of command
+        if job.log_output:
+            job.output.seek(0)
+            for line in job.output:
+                job.logger.debug('   Out: '+line.decode('ascii', 'replace').rstrip())
+        job.output.close()
+
+        return job.status
+
+    def kill(self, job):
+        """terminate a running job (all its processes are killed after a grace period)"""
+        if not job.done() and job.kill_time is None:
+            job.kill_time = time.time()
+            signal_process_group(job.process, signal.SIGTERM)
+
+    def kill_all(self, grace=KILL_GRACE):
+        """terminate all running jobs and commands of run_command(), processes still running
+        after grace seconds are killed (the testsuite must not leave any process behind)"""
+
+        jobs = self.running()
+        for job in jobs:
+            self.kill(job)
+        deadline = time.time() + grace
+        for job in jobs:
+            job.finished.wait(max(0.0, deadline - time.time()))
+            signal_process_group(job.process, signal.SIGKILL)
+        kill_running_commands(grace)
+
+    def running(self):
+        """return the list of running jobs"""
+        with self.lock:
+            return list(self.jobs)
+
+    def __finish(self, job, status):
+        job.status = status
+        job.end_time = time.time()
+        job.finished.set()
+
+    @staticmethod
+    def __reap(job):
+        """return the exit status of a job which has finished and collect its resource usage,
+        or None if it is still running"""
+
+        process = job.process
+        if process.returncode is not None:
+            return process.returncode
+        try:
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        except ChildProcessError:
+            # already reaped elsewhere, no resource usage available
+            return process.poll()
+        if pid == 0:
+            return None
+        if os.WIFSIGNALED(status):
+            process.returncode = -os.WTERMSIG(status)
+        else:
+            process.returncode = os.WEXITSTATUS(status)
+        job.rusage = rusage
+        return process.returncode
+
+    def __poll(self, job):
+        """check a single job, return True if it has finished"""
+
+        status = self.__reap(job)
+
+        # search the new lines of the log for crash patterns (the whole log once the job has finished)
+        if job.watcher is not None and job.crash is None:
+            job.crash = job.watcher.poll(final=status is not None)
+            if job.crash is not None and status is None:
+                job.logger.info('Crash pattern found in line %i of %s, aborting the command' %
+                                (job.crash.lineno, job.watcher.filename))
+                self.kill(job)
+
+        if status is not None:
+            # processes left behind by the command (e.g. MPI ranks) must not occupy the cores
+            signal_process_group(job.process, signal.SIGKILL)
+            self.__finish(job, -2 if job.timed_out else status)
+            return True
+
+        if job.kill_time is not None:
+            if time.time() - job.kill_time > KILL_GRACE:
+                signal_process_group(job.process, signal.SIGKILL)
+        elif job.timeout and job.elapsed() > job.timeout:
+            job.logger.error('Timeout for system command: '+command_str(job.cmd))
+            job.timed_out = True
+            self.kill(job)
+
+        return False
+
+    def __poll_loop(self):
+        """background thread polling all running jobs until none are left"""
+
+        while True:
+            with self.lock:
+                jobs = list(self.jobs)
+            for job in jobs:
+                if self.__poll(job):
+                    with self.lock:
+                        self.jobs.remove(job)
+            with self.lock:
+                if not self.jobs:
+                    self.thread = None
+                    return
+            time.sleep(self.interval)
+
+
+# central supervisor of the testsuite
+supervisor = Supervisor()
@@ -8,18 +8,32 @@ evaluate a single test.
 """
 
 # built-in modules
-import os, sys, copy, math, re, glob
+import os, sys, copy, math, re, glob, time, hashlib, shutil, threading, shlex
+from concurrent import futures
 
 # private modules
 from ts_error import StopError, SkipError
-from ts_utilities import dir_path, status_str, pretty_status_str, system_command, change_dir, write_environ
-from ts_fortran_nl import get_param, replace_param
+from ts_utilities import dir_path, status_str, pretty_status_str, command_str, checker_environ, \
+                         copy_file, copy_tree, remove_directory_content, store_file, link_file, \
+                         link_tree
+from ts_fortran_nl import Namelist
+from ts_testlist import derived_paths
+from ts_supervisor import supervisor
+from ts_checkers import call_checker
+from ts_cache import run_key, copy_outputs
+from ts_resources import format_resources
+from ts_logwatcher import LogWatcher
+from ts_logger import BufferedLogger
 
 # information
 __author__     = "Nicolo Lardelli, Xavier Lapillonne, Oliver Fuhrer, Santiago Moreno"
 __email__      = "cosmo-wg6@cosmo.org"
 __maintainer__ = "xavier.lapillonne@meteoswiss.ch"
 
+# templates of run directories which have been built by this invocation of the testsuite
+_templates = set()
+_templates_lock = threading.Lock()
+
 
 class Test:
     """Class representing a test and allows setting up, running and evaluating a test"""
@@ -34,6 +48,15 @@ class Test:
         self.conf = copy.copy(conf) # storage of the auxiliary parameters
         self.logger = logger            # store logger
         self.result = 30                # default to CRASH
+        self.timings = {}               # time spent in the different phases (in s)
+        self.resources = None           # resources used by the model run (see Job.resources())
+        self.job = None                 # handle of the running model (see start())
+        self.cache = None               # cache of the results of model runs (or None)
+        self.shared_runs = None         # model runs shared between tests (or None)
+        self.run_key = None             # key of the model run of this test
+        self.cancelled = False          # model run has been cancelled (see cancel())
+        self.namelists = {}             # namelists of the run directory modified by prepare()
+        self.template = None            # template the run directory has been cloned from
 
         # define prerun actions
         if node.findtext('prerun'):
@@ -46,27 +69,19 @@ class Test:
         self.inputdir = dir_path(self.basedir + 'data/' + self.type) # set path for input directory
 
         self.rundir = dir_path(options.workdir) + dir_path(self.type) + dir_path(self.name)
-        if node.findtext('namelistdir'):
-            self.namelistdir = dir_path(self.basedir + 'data/' + node.findtext('namelistdir'))
-        else:
-            #default is  self.type/self.name
-            self.namelistdir = dir_path(self.basedir + 'data/' + self.type + '/' + self.name)
-
-
-        if node.findtext('refoutdir'):
-            # set reference output directory, two possibility
-            # 1. relative to current path, if name starts with ../
-            # 2. relative to the main directory is starts with a string
-            refoutdir = dir_path(node.findtext('refoutdir'))
-            pattern = '[.][.][/](.*)'
-            matchobj = re.match(pattern,refoutdir)
-            if matchobj:
-                self.refoutdir = self.rundir+refoutdir
-            else:
-                self.refoutdir = self.basedir+'data/'+refoutdir
+        # namelistdir defaults to self.type/self.name, refoutdir to the namelistdir
+        namelistdir, refoutdir = derived_paths(node)
+        self.namelistdir = dir_path(self.basedir + 'data/' + namelistdir)
+
+        # set reference output directory, two possibility
+        # 1. relative to current path, if name starts with ../
+        # 2. relative to the main directory is starts with a string
+        pattern = '[.][.][/](.*)'
+        matchobj = re.match(pattern,refoutdir)
+        if matchobj:
+            self.refoutdir = self.rundir+refoutdir
         else:
-            #default is  self.namelistdir
-            self.refoutdir = self.namelistdir
+            self.refoutdir = self.basedir+'data/'+refoutdir
 
         # set dependecy directory
         depend = self.node.findtext("depend")
@@ -100,16 +115,6 @@ class Test:
         self.tolerance=self.options.tolerance
 
 
-    def run_test(self):
-        """ check whether this test should be carried out in case "only" option is used"""
-        if self.options.only is not None:
-            if self.options.only=='%s,%s' %(self.type,self.name):
-                return True
-            else:
-                return False
-        else:
-            return True
-
     def __prepare_print(self):
         """print infos about the upcoming test at the start"""
         self.logger.info('')
@@ -118,10 +123,15 @@ class Test:
     def prepare(self):
         """prepare test directory and namelists for this test"""
 
+        start_time = time.time()
+
         self.__setup_directory()
 
         self.__setup_executable()
 
+        # namelists are parsed once, modified in memory and written back at the end
+        self.namelists = {}
+
         self.__adapt_namelists()
 
         self.__set_parallelization()
@@ -130,19 +140,20 @@ class Test:
 
         self.__set_pert()
 
+        self.__write_namelists()
+
         self.__prepare_print()
 
+        self.timings['prepare'] = time.time() - start_time
+
 
     def prerun(self):
         """check dependencies and perform any prerun actions"""
 
-        # change to run directory
-        status = change_dir(self.rundir, self.logger)
-
-        # check whether dependencies have run
+        # check whether dependencies have run (dependdir may be relative to rundir)
         if self.dependdir != None:
             try:
-                f = open(self.dependdir + '/' + self.conf.res_file, "r")
+                f = open(os.path.join(self.rundir, self.dependdir, self.conf.res_file), "r")
                 dresult = f.readline()
 
                 if dresult == 'CRASH':
@@ -161,65 +172,192 @@ class Test:
                 raise SkipError('Restart is not compatible with short tests')
 
             # copy restart file
-            status = system_command('/bin/cp '+self.dependdir+'/output/lr* '+self.rundir+'output/', self.logger, throw_exception=False)
-            if status:
+            restart_files = glob.glob(os.path.join(self.rundir, self.dependdir, 'output', 'lr*'))
+            if not restart_files:
+                raise SkipError('Problem with restart file from '+self.dependdir)
+            try:
+                for filename in restart_files:
+                    copy_file(filename, self.rundir+'output/')
+            except (OSError, IOError) as e:
+                self.logger.debug(str(e))
                 raise SkipError('Problem with restart file from '+self.dependdir)
 
 
     def start(self):
-        """launch test"""
+        """launch test in the background and return the handle of the running model
+        (None if the results of an identical model run have been reused)"""
+
+        if self.cancelled:
+            raise SkipError('Test has been cancelled')
 
         self.logger.info('Starting test')
+        self.start_time = time.time()
+
+        self.log_file = 'exe.log'
+
+        # reuse the results of an identical model run if available, tests waiting for the
+        # run of this test are released in any case (also if the model cannot be launched)
+        self.job = None
+        reused = False
+        try:
+            reused = self.__reuse_run()
+            if not reused:
+                self.__launch()
+        finally:
+            if reused:
+                self.release_run(True)
+            elif self.job is None:
+                self.release_run(False)
+
+        # the test may have been cancelled while launching the model
+        if self.job is not None and self.cancelled:
+            supervisor.kill(self.job)
 
-        # change to run directory for this test
-        status = change_dir(self.rundir, self.logger)
+        return self.job
+
+
+    def __launch(self):
+        """launch the model in the background"""
 
         # generate launch command
-        self.log_file = 'exe.log'
         redirect_output = '> %s 2>&1' %(self.log_file)
 
+        # the run command is a list of arguments which is executed without a shell
         if self.options.mpicmd == '':
-            run_cmd = ''
+            run_cmd = []
         else:
             if '&NTASKS' in self.options.mpicmd:
                 #special case when n nodes cannot be given as last argument of
                 #mpicmd command, e.g. with mpirun_rsh
-                run_cmd = self.options.mpicmd.replace('&NTASKS',str(self.nprocs))
+                run_cmd = [arg.replace('&NTASKS',str(self.nprocs)) for arg in shlex.split(self.options.mpicmd)]
             else:
-                run_cmd = self.options.mpicmd + ' ' + str(self.nprocs)
+                run_cmd = shlex.split(self.options.mpicmd) + [str(self.nprocs)]
 
         # writes the wrapper script in case a wrapper run of testsuite is required
         if self.options.use_wrappers:
-            f = open('wrapper.sh','w')
+            f = open(self.rundir+'wrapper.sh','w')
             f.write('#!/bin/sh\n')
             f.write('./'+self.executable+' '+self.options.args+' '+redirect_output+'\n')
             f.close()
-            status = os.chmod('wrapper.sh',0x755)
+            status = os.chmod(self.rundir+'wrapper.sh',0x755)
             if status:
                 raise StopError('Problem changing permissions on wrapper.sh')
-            run_cmd = run_cmd + ' ./' + 'wrapper.sh'
+            run_cmd = run_cmd + ['./wrapper.sh']
+            output = None
         else:
-            run_cmd=run_cmd + ' ./' + self.executable + ' ' + self.options.args + ' ' + redirect_output
+            run_cmd = run_cmd + ['./' + self.executable] + shlex.split(self.options.args)
+            output = self.rundir + self.log_file
 
         # displays the run command
-        self.logger.info('Executing: '+run_cmd)
+        if output is None:
+            self.logger.info('Executing: '+command_str(run_cmd))
+        else:
+            self.logger.info('Executing: '+command_str(run_cmd)+' '+redirect_output)
+
+        # the log is searched for crash patterns while the model is running
+        watcher = None
+        if self.conf.crash_patterns:
+            watcher = LogWatcher(self.rundir + self.log_file, self.conf.crash_patterns)
+
+        # launches the run command (the supervisor enforces the timeout and aborts on crash patterns)
+        try:
+            self.job = supervisor.launch(run_cmd, self.logger, cwd=self.rundir, timeout=self.options.timeout,
+                                         output=output, watcher=watcher)
+        except OSError as e:
+            self.logger.error(e)
+            raise StopError('Problem with launching system command: '+command_str(run_cmd))
+
+
+    def __reuse_run(self):
+        """copy the outputs of an identical model run (of another test or from the cache) into
+        the run directory, return False if the model has to be run"""
+
+        if self.cache is None and self.shared_runs is None:
+            return False
+        self.run_key = run_key(self)
+
+        if self.shared_runs is not None:
+            other = self.shared_runs.acquire(self.run_key, self)
+            if other is not None:
+                copy_outputs(other.rundir, self.rundir)
+                self.logger.info('Reusing results of model run of test %s/%s' %(other.type, other.name))
+                return True
 
-        # executes the run command
-        status = system_command(run_cmd, self.logger, issue_error=False, timeout=self.options.timeout)
+        if self.cache is not None:
+            try:
+                restored = self.cache.restore(self.run_key, self.rundir)
+            except OSError as e:
+                # the cache is optional, the model is run
+                self.logger.warning('Problem restoring results of model run from cache: %s' %(e))
+                restored = False
+            if restored:
+                self.logger.info('Restored results of model run from cache (%s)' %(self.run_key))
+                return True
 
+        return False
 
-    def wait(self):
-        """wait for completion of test"""
 
-        # currently assumes that tests are run sequentially and all work is done in the start() method
-        self.logger.info('Test finished')
+    def wait(self):
+        """wait for completion of test and return the exit status of the model"""
+
+        if self.job is None:
+            # results have been restored from the cache (no runtime is recorded)
+            return 0
+
+        # tests waiting for the run of this test are released once its outputs are final
+        success = False
+        try:
+            status = supervisor.wait(self.job)
+            if self.cancelled:
+                raise SkipError('Model run has been cancelled')
+            self.timings['run'] = time.time() - self.start_time
+            self.resources = self.job.resources()
+            self.logger.info('Test finished')
+            if self.resources is not None:
+                self.logger.info('Resources: ' + format_resources(self.resources))
+            if status > 0:
+                self.logger.info('Model exited with status %i' %(status))
+            elif status < 0 and not self.job.timed_out:
+                self.logger.info('Model was terminated by signal %i' %(-status))
+
+            # store results of successful model runs in the cache
+            crash = self.job.crash
+            success = status == 0 and crash is None
+            if success and self.cache is not None:
+                try:
+                    self.cache.store(self.run_key, self.rundir)
+                except OSError as e:
+                    self.logger.warning('Problem storing results of model run in cache: %s' %(e))
+        finally:
+            self.release_run(success)
+
+        # the model has printed a crash pattern, the checkers are not called
+        if crash is not None:
+            self.result = 30 # CRASH
+            raise StopError('Model crashed, pattern "%s" found in line %i of %s: %s'
+                            %(crash.pattern, crash.lineno, self.log_file, crash.line))
+
+        return status
+
+
+    def cancel(self):
+        """abort the model run of this test (the test is skipped)"""
+
+        self.cancelled = True
+        if self.job is not None:
+            supervisor.kill(self.job)
+
+
+    def release_run(self, success):
+        """make the model run of this test available to other tests with the same configuration"""
+        if self.shared_runs is not None:
+            self.shared_runs.release(self.run_key, self, success)
 
 
     def check(self):
         """perform checks"""
 
-        # change to base directory
-        status = change_dir(self.basedir, self.logger)
+        start_time = time.time()
 
         # scan for the checker within the xml tree
         checkerlist = []
@@ -240,19 +378,31 @@ class Test:
         else:
             self.forcematch=0
 
-        # assignement of the environment variables for checker
-        write_environ(self)
+        # context of the checkers (passed as environment variables to checkers run from basedir)
+        context = checker_environ(self)
+
+        # the checkers are independent and are called concurrently, except when tuning thresholds
+        # since several checkers may update the same tolerance file
+        if self.options.tune_thresholds:
+            nthreads = 1
+        else:
+            nthreads = max(1, self.options.checker_threads)
+
+        def run_checker(checker):
+            logger = BufferedLogger(self.logger)
+            checker_result,soutput = call_checker(checker, context, logger, cwd=self.basedir)
+            return logger,checker_result,soutput
+
+        with futures.ThreadPoolExecutor(max_workers=nthreads) as executor:
+            results = list(executor.map(run_checker, checkerlist))
 
-        # traversing of the checkerlist
+        # traversing of the checkerlist (in the order of the xml specification)
         summary_list = []
-        for checker in checkerlist:
+        for checker,(logger,checker_result,soutput) in zip(checkerlist, results):
 
             self.logger.debug(checker+' START')
+            logger.flush()
 
-            # run checker and save result
-            checker_result,soutput = system_command(os.path.join(os.path.dirname(__file__), "../checkers/")+checker, self.logger, \
-                                                      return_output=True,throw_exception=False, \
-                                                      issue_error=False)
             # print checker output
             for line in soutput.split('\n'):
                 if not line=='':
@@ -272,6 +422,8 @@ class Test:
         else:
             self.result = 0
 
+        self.timings['check'] = time.time() - start_time
+
         # in case of fail or crash signal a stop to the testsuite
         if self.result >= 20:
             raise StopError
@@ -282,12 +434,15 @@ class Test:
 
         # print the final result
         self.logger.result(0, self.result, 'RESULT %s/%s: %s' %(self.type,self.name,self.description))
-
-        # change to run directory for this test
-        status = change_dir(self.rundir, self.logger)
-
-        # write in a file (this is used for test dependency)
-        f = open(self.conf.res_file, "w")
+        if self.timings:
+            self.logger.info('Elapsed time: ' + ', '.join(['%s %.2f s' %(phase, self.timings[phase])
+                for phase in ['prepare', 'run', 'check'] if phase in self.timings]))
+
+        # write in a file (this is used for test dependency), the directory does not exist if the
+        # test has been skipped without preparing it
+        if not os.path.isdir(self.rundir):
+            os.makedirs(self.rundir)
+        f = open(self.rundir + self.conf.res_file, "w")
         f.write(status_str(self.result))
         f.close()
 
@@ -300,11 +455,8 @@ class Test:
 
         # checks if is the test is a titular test
         if re.match(pattern,text):
-            status = change_dir(self.rundir, self.logger)
             self.logger.important('Updating namelist data/' + self.type + '/' + self.name)
-            cmd = 'cp INPUT* ' + self.namelistdir
-            self.logger.debug('Executing: ' + cmd)
-            status = system_command(cmd, self.logger)
+            self.__copy_back(['INPUT*'])
             self.result = 0 # MATCH
         else:
             raise SkipError('No test repository ' + 'data/' + self.type + '/' + self.name)
@@ -320,18 +472,28 @@ class Test:
 
         # checks if is the test is a base test
         if re.match(pattern,text):
-            status = change_dir(self.rundir, self.logger)
-            if not os.path.exists(self.conf.yufile):
+            if not os.path.exists(self.rundir + self.conf.yufile):
                 raise SkipError('No file ' +self.conf.yufile+' in '+self.rundir)
 
             self.logger.info('Updating exe.log YU* ' + self.namelistdir)
-            cmd = 'cp exe.log YU* '+self.namelistdir
-            self.logger.debug('Executing: '+cmd)
-            status = system_command(cmd, self.logger)
+            self.__copy_back(['exe.log', 'YU*'])
             self.result = 0 # MATCH
         else:
             raise SkipError('No test repository ' +'data/'+self.type+'/'+self.name)
 
+    def __copy_back(self, patterns):
+        """copy files of the run directory matching the patterns into the namelist directory"""
+
+        filenames = []
+        for pattern in patterns:
+            filenames += sorted(glob.glob(self.rundir + pattern))
+        self.logger.debug('Copy ' + ' '.join([os.path.basename(f) for f in filenames]) + ' to ' + self.namelistdir)
+        try:
+            for filename in filenames:
+                copy_file(filename, self.namelistdir)
+        except (OSError, IOError) as e:
+            raise StopError('Problem copying files to %s: %s' %(self.namelistdir, e))
+
 
 
     def __setup_directory(self):
@@ -339,26 +501,76 @@ class Test:
 
         self.logger.info('Creating directory for '+self.name)
 
-        node = self.node
+        start_time = time.time()
+        try:
+            template = self.__setup_template()
+            self.template = template
+
+            # create run directory
+            if not os.path.isdir(self.rundir):
+                os.makedirs(self.rundir)
+
+            # removal of all the possible pre-existing files
+            remove_directory_content(self.rundir)
+
+            # files which are modified by the testsuite (e.g. changepar) have to be real copies
+            modified = [self.conf.par_file, self.conf.io_file]
+            modified += [str(chpar.attrib.get('file')) for chpar in self.node.findall("changepar")]
+
+            # clone the template, namelists are copied and the auxiliary input is linked
+            self.logger.debug('Clone '+template)
+            for entry in os.scandir(template):
+                target = self.rundir + entry.name
+                if entry.is_symlink():
+                    os.symlink(os.readlink(entry.path), target)
+                elif entry.is_dir():
+                    link_tree(entry.path, target)
+                elif entry.name.startswith('INPUT') or entry.name in modified:
+                    copy_file(entry.path, target)
+                else:
+                    link_file(entry.path, target)
 
-        # create run directory and move there
-        status = system_command('/bin/mkdir -p '+self.rundir, self.logger)
-        status = change_dir(self.rundir, self.logger)
+            # generation of the output folder
+            os.mkdir(self.rundir+'output')
 
-        # removal of all the possible pre-existing files
-        status = system_command('/bin/rm -r -f *', self.logger)
+        except (OSError, IOError) as e:
+            raise StopError('Problem setting up directory %s: %s' %(self.rundir, e))
 
-        # explicit copy of the namelists (copy is required since we will apply the change_par)
-        status = system_command('/bin/cp -f '+self.namelistdir+'INPUT* .', self.logger)
+        self.logger.info('Directory set up in %.3f s' %(time.time() - start_time))
 
-        # copy of the auxiliary input parameters if exists
-        if not glob.glob(os.path.join(dir_path(self.inputdir)+'in_aux/', '*'))==[]:
-            status = system_command('/bin/cp -f -r '+dir_path(self.inputdir)+'in_aux/* ./', self.logger)
 
-        # linking input binary fields
-        status = system_command('/bin/ln -s '+dir_path(self.inputdir)+'input .', self.logger)
-        # generation of the output folder
-        status = system_command('/bin/mkdir -p output', self.logger)
+    def __setup_template(self):
+        """return the template directory for the namelistdir and input of this test, the template
+        contains the namelists, the auxiliary input and the link to the input binary fields and is
+        built once per invocation of the testsuite"""
+
+        key = hashlib.sha1((self.namelistdir + '\n' + self.inputdir).encode()).hexdigest()
+        template = dir_path(self.options.workdir) + '.templates/' + key[:16] + '/'
+
+        with _templates_lock:
+            if template in _templates:
+                return template
+
+            self.logger.debug('Building template '+template+' for '+self.namelistdir)
+            if os.path.isdir(template):
+                shutil.rmtree(template)
+            os.makedirs(template)
+
+            # explicit copy of the namelists (copy is required since we will apply the change_par)
+            for filename in sorted(glob.glob(self.namelistdir+'INPUT*')):
+                copy_file(filename, template)
+
+            # copy of the auxiliary input parameters if exists
+            in_aux = dir_path(self.inputdir)+'in_aux/'
+            if os.path.isdir(in_aux):
+                copy_tree(in_aux, template)
+
+            # linking input binary fields
+            os.symlink(dir_path(self.inputdir)+'input', template+'input')
+
+            _templates.add(template)
+
+        return template
 
 
     def __setup_executable(self):
@@ -372,7 +584,16 @@ class Test:
         # copy of the executable
         if not os.path.exists(self.basedir+self.executable):
             raise SkipError('Executable '+self.basedir+self.executable+' does not exist')
-        status = system_command('/bin/cp '+self.basedir+self.executable+' .', self.logger)
+        # the executable is placed once into a store in the working directory and linked from there
+        try:
+            if self.options.copy_exe:
+                copy_file(self.basedir+self.executable, self.rundir)
+            else:
+                stored = store_file(self.basedir+self.executable, dir_path(self.options.workdir)+'.exe_store/')
+                self.logger.debug('Link '+stored)
+                link_file(stored, self.rundir+os.path.basename(self.executable))
+        except (OSError, IOError) as e:
+            raise StopError('Problem copying executable %s: %s' %(self.basedir+self.executable, e))
 
 
     def __adapt_namelists(self):
@@ -389,8 +610,9 @@ class Test:
                 self.logger.error('changepar encountered without file attribute')
                 continue
 
-            filename = str(filename)
-            newparname = str(chpar.attrib['name'])
+            nl = self.__namelist(str(filename))
+            # the name may be prefixed by the group of the namelist (e.g. runctl:nstop)
+            group, sep, newparname = str(chpar.attrib['name']).rpartition(':')
 
             # look if optional attribute occurrence exists
             try:
@@ -402,15 +624,15 @@ class Test:
             parname = newparname
             for (param1, param2) in self.conf.dual_params:
                 if param1 == parname:
-                    if get_param(filename,parname,occurrence=occurrence) == '':
+                    if nl.get(group+sep+parname,occurrence=occurrence) == '':
                         parname = param2
                 if param2 == parname:
-                    if get_param(filename,parname,occurrence=occurrence) == '':
+                    if nl.get(group+sep+parname,occurrence=occurrence) == '':
                         parname = param1
 
             value = chpar.text
             modstring = newparname + '=' + str(value)
-            replace_param(filename, parname, modstring, occurrence=occurrence)
+            nl.set(group+sep+parname, modstring, occurrence=occurrence)
 
             # if nprocio has been overwritten, remove configuration (XML should have precedence)
             if parname == 'nprocio':
@@ -420,35 +642,37 @@ class Test:
         """set perturbation in the parameter file to true or false depending on the given option"""
         if self.conf.pert_avail == 'True':
              pert = self.options.pert
-             replace_param(self.conf.par_file,'itype_pert',' itype_pert=%i' %pert)
+             self.__namelist(self.conf.par_file).set('itype_pert',' itype_pert=%i' %pert)
 
     def __set_parallelization(self):
 
         self.logger.info('Set domain decomposition and number of I/O PEs')
 
+        par_nl = self.__namelist(self.conf.par_file)
+
         ### extract number of I/O processors
         if self.options.nprocio is not None:
             nprocio = self.options.nprocio
         else:
-            if get_param(self.conf.par_file,'num_iope_percomm') != '':
-               num_iope_percomm = int(get_param(self.conf.par_file,'num_iope_percomm'))
-               num_asynio_comm = int(get_param(self.conf.par_file,'num_asynio_comm'))
+            if par_nl.get('num_iope_percomm') != '':
+               num_iope_percomm = int(par_nl.get('num_iope_percomm'))
+               num_asynio_comm = int(par_nl.get('num_asynio_comm'))
                nprocio = num_asynio_comm * num_iope_percomm
             else:
-               nprocio = int(get_param(self.conf.par_file,'nprocio'))
+               nprocio = int(par_nl.get('nprocio'))
 
         # sets the number of I/O processors
-        if get_param(self.conf.par_file,'num_iope_percomm') != '':
+        if par_nl.get('num_iope_percomm') != '':
            if nprocio == 0:
-              replace_param(self.conf.par_file,'num_iope_percomm',' num_iope_percomm=0')
-              replace_param(self.conf.io_file,'lasync_io',' lasync_io=.FALSE.')
+              par_nl.set('num_iope_percomm',' num_iope_percomm=0')
+              self.__namelist(self.conf.io_file).set('lasync_io',' lasync_io=.FALSE.')
 
            else:
-              replace_param(self.conf.par_file,'num_iope_percomm',' num_iope_percomm=1')
-              replace_param(self.conf.io_file,'lasync_io',' lasync_io=.TRUE.')
-           replace_param(self.conf.par_file,'num_asynio_comm',' num_asynio_comm=%i' %nprocio)
+              par_nl.set('num_iope_percomm',' num_iope_percomm=1')
+              self.__namelist(self.conf.io_file).set('lasync_io',' lasync_io=.TRUE.')
+           par_nl.set('num_asynio_comm',' num_asynio_comm=%i' %nprocio)
         else:
-           replace_param(self.conf.par_file,'nprocio',' nprocio=%i' %nprocio)
+           par_nl.set('nprocio',' nprocio=%i' %nprocio)
 
         # generates the parallelist
         parlist = []
@@ -466,8 +690,8 @@ class Test:
         # writes the new MPI decomposition
         nprocx = parlist[ap-1][0]
         nprocy = parlist[ap-1][1]
-        replace_param(self.conf.par_file, 'nprocx', ' nprocx=%i' %nprocx)
-        replace_param(self.conf.par_file, 'nprocy', ' nprocy=%i' %nprocy)
+        par_nl.set('nprocx', ' nprocx=%i' %nprocx)
+        par_nl.set('nprocy', ' nprocy=%i' %nprocy)
 
         # echo to log
         self.logger.info('Processors distribution set to ' +
@@ -482,10 +706,28 @@ class Test:
 
             modstring = 'nstop=' + str(self.options.steps)
             parname = 'nstop'
-            filename = self.conf.par_file
-            if get_param(filename,'nstop') == '':
+            nl = self.__namelist(self.conf.par_file)
+            if nl.get('nstop') == '':
                 parname = 'hstop'
-            replace_param(filename, parname, modstring)
+            nl.set(parname, modstring)
+
+
+    def __namelist(self, filename):
+        """return the (in-memory) namelist of a file in the run directory"""
+        if filename not in self.namelists:
+            # the run directory contains unmodified copies of the namelists of the template,
+            # these are parsed from the template such that all its clones share the cached entries
+            source = None
+            if self.template is not None:
+                source = self.template + filename
+            self.namelists[filename] = Namelist(self.rundir + filename, source=source)
+        return self.namelists[filename]
+
+
+    def __write_namelists(self):
+        """write back all modified namelists"""
+        for filename in sorted(self.namelists):
+            self.namelists[filename].write()
 
 
     @staticmethod
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+This module reads the testlist and selects the tests to run. Each test of the XML file
+is compiled into an entry (type, name, tags, checkers and the derived namelist and
+reference directories of the test together with its XML definition) on which the
+selections are done.
+
+tests = load_testlist('testlist.xml', logger)
+for entry in select_tests(tests, options, basedir):
+    node = xml_node(entry)
+"""
+
+# built-in modules
+import os, re, fnmatch
+import xml.etree.ElementTree as XML
+
+# information
+__author__     = "Oliver Fuhrer, Xavier Lapillonne"
+__email__      = "cosmo-wg6@cosmo.org"
+__maintainer__ = "xavier.lapillonne@meteoswiss.ch"
+
+# directory containing the sources of the testsuite (a change affects all tests)
+sourcedir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+checkerdir = os.path.join(sourcedir, 'checkers')
+
+
+def derived_paths(node):
+    """return the namelist directory and the reference directory of a test (relative to the data
+    folder, the reference directory is relative to the run directory if it starts with ../)"""
+
+    namelistdir = node.findtext('namelistdir')
+    if not namelistdir:
+        namelistdir = node.attrib['type'] + '/' + node.attrib['name']
+    namelistdir = _dir(namelistdir)
+
+    refoutdir = node.findtext('refoutdir')
+    if refoutdir:
+        refoutdir = _dir(refoutdir)
+    else:
+        refoutdir = namelistdir
+
+    return namelistdir, refoutdir
+
+
+def _dir(path):
+    return path.rstrip('/') + '/'
+
+
+def compile_testlist(root):
+    """return the entries of all tests of a parsed testlist"""
+
+    tests = []
+    for node in root.findall('test'):
+        namelistdir, refoutdir = derived_paths(node)
+        depend = node.findtext('depend')
+        tags = []
+        for tag in node.findall('tag'):
+            tags += [t.strip() for t in (tag.text or '').split(',') if t.strip()]
+        tests.append({
+            'type': node.attrib.get('type'),
+            'name': node.attrib.get('name'),
+            'tags': tags,
+            'checkers': [c.text.strip() for c in node.findall('checker') if c.text],
+            'namelistdir': namelistdir,
+            'refoutdir': refoutdir,
+            'depend': depend.strip(' ') if depend else None,
+            'executable': node.findtext('executable'),
+            'node': node,
+        })
+    return tests
+
+
+def load_testlist(filename, logger):
+    """return the entries of the tests of a testlist (raises XML.ParseError or OSError)"""
+
+    logger.debug('Reading testlist '+filename)
+    return compile_testlist(XML.parse(filename).getroot())
+
+
+def xml_node(entry):
+    """return the XML definition of a test"""
+    return entry['node']
+
+
+def match_only(only, testtype, name):
+    """check whether a test matches one of the selections type,name (which may contain wildcards)"""
+
+    if only is None:
+        return True
+    if not isinstance(only, list):
+        only = [only]
+    for selection in only:
+        pattern_type, sep, pattern_name = selection.strip().partition(',')
+        if fnmatch.fnmatchcase(testtype, pattern_type) and fnmatch.fnmatchcase(name, pattern_name or '*'):
+            return True
+    return False
+
+
+def _split(value):
+    """return the comma separated items of an option given one or several times"""
+    if value is None:
+        return None
+    if not isinstance(value, list):
+        value = [value]
+    return [item.strip() for v in value for item in v.split(',') if item.strip()]
+
+
+def _rundir_key(entry, relpath):
+    """return type and name of the test in the working directory addressed by a path relative
+    to the run directory of entry (e.g. ../test_basic)"""
+    path = os.path.normpath(os.path.join(entry['type'], entry['name'], relpath))
+    return tuple(path.split(os.sep)) if path.count(os.sep) == 1 else None
+
+
+def affected_tests(tests, changed, basedir, exe=None):
+    """return type and name of the tests affected by a list of changed files (namelists, reference files, input,
+    checkers or executable of a test) and the tests using them as reference or dependency"""
+
+    changed = [os.path.abspath(path) for path in changed]
+    datadir = os.path.join(basedir, 'data')
+
+    def under(directory):
+        directory = os.path.normpath(directory)
+        return any([path == directory or path.startswith(directory + os.sep) for path in changed])
+
+    # a change of the testsuite itself or of the configuration affects all tests
+    if any([path.endswith('.cfg') for path in changed]) or \
+       under(os.path.join(sourcedir, 'tools')) or os.path.join(sourcedir, 'testsuite.py') in changed:
+        return set([(entry['type'], entry['name']) for entry in tests])
+
+    affected = set()
+    for entry in tests:
+        directories = [os.path.join(datadir, entry['namelistdir']),
+                       os.path.join(datadir, entry['type'], 'input'),
+                       os.path.join(datadir, entry['type'], 'in_aux')]
+        if not entry['refoutdir'].startswith('../'):
+            directories.append(os.path.join(datadir, entry['refoutdir']))
+        files = [os.path.join(checkerdir, checker) for checker in entry['checkers']]
+        executable = exe or entry['executable']
+        if executable:
+            files.append(os.path.normpath(os.path.join(basedir, executable)))
+        if any([under(d) for d in directories]) or any([f in changed for f in files]):
+            affected.add((entry['type'], entry['name']))
+
+    # tests comparing against or depending on an affected test
+    modified = True
+    while modified:
+        modified = False
+        for entry in tests:
+            if (entry['type'], entry['name']) in affected:
+                continue
+            refs = [entry['depend']]
+            if entry['refoutdir'].startswith('../'):
+                refs.append(entry['refoutdir'])
+            for ref in refs:
+                if ref and ref.startswith('../') and _rundir_key(entry, ref) in affected:
+                    affected.add((entry['type'], entry['name']))
+                    modified = True
+                    break
+
+    return affected
+
+
+def select_tests(tests, options, basedir):
+    """return the tests selected by the command line options (all filters have to match)"""
+
+    selected = [entry for entry in tests if match_only(options.only, entry['type'], entry['name'])]
+
+    if options.match:
+        regex = re.compile(options.match)
+        selected = [entry for entry in selected if regex.search(entry['type'] + ',' + entry['name'])]
+
+    tags = _split(options.tag)
+    if tags:
+        selected = [entry for entry in selected if set(tags) & set(entry['tags'])]
+
+    checkers = _split(options.checker)
+    if checkers:
+        selected = [entry for entry in selected if set(checkers) & set(entry['checkers'])]
+
+    changed = _split(options.changed)
+    if changed is not None:
+        affected = affected_tests(tests, changed, basedir, options.exe)
+        selected = [entry for entry in selected if (entry['type'], entry['name']) in affected]
+
+    return selected
@@ -7,7 +7,11 @@ Collection of general purpose utility functions
 """
 
 # built-in modules
-import re, os, subprocess
+import re, os, time, subprocess, hashlib, shutil, threading, tempfile, collections, signal, shlex
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # private modules
 from ts_error import StopError
@@ -36,71 +40,246 @@ def dir_path(path):
         return path+'/'
 
 
-def change_dir(dir, logger, throw_exception=True):
-    """wrapper to issue a change of working directory and handle errors"""
+# maximum size of the output of a system command which is kept in memory (in bytes)
+MAX_OUTPUT = 4*1024*1024
 
-    logger.debug('ChgDir: '+dir+' (from '+str(os.getcwd())+')')
+# time in s processes get to terminate before they are killed
+KILL_GRACE = 2.0
 
-    status = os.chdir(dir)
 
-    if status:
-        if throw_exception:
-            raise StopError('Problem changing to directory '+dir)
-        else:
-            logger.error('Problem changing to directory '+dir)
+def command_str(cmd):
+    """return a printable version of a command given as string or list of arguments"""
+    if isinstance(cmd, str):
+        return cmd
+    return ' '.join([shlex.quote(arg) for arg in cmd])
 
 
-def system_command(cmd, logger, throw_exception=True, return_output=False, issue_error=True, timeout=None):
-    """wrapper to launch systems commands and handle stdout/stderr and exit status correctly"""
+def signal_process_group(process, sig):
+    """send a signal to all processes of a command started in its own session (e.g. the ranks
+    of an MPI job), return False if none of them is left"""
+    try:
+        os.killpg(process.pid, sig)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+# commands of run_command() which are running (killed if the testsuite is aborted)
+_running_commands = set()
+_running_lock = threading.Lock()
+
+# number of unused entries kept in a store by prune_store (e.g. still linked by the run directories
+# of tests which have not been run again)
+STORE_KEEP = 2
+
+# entries of the stores used by this invocation
+_store_entries = set()
+
+
+def kill_process_group(process, grace=KILL_GRACE):
+    """terminate a command started in its own session together with all processes it has
+    started, processes which are still running after grace seconds are killed"""
+
+    if signal_process_group(process, signal.SIGTERM):
+        try:
+            process.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            pass
+        signal_process_group(process, signal.SIGKILL)
+    process.wait()
+
+
+def kill_running_commands(grace=KILL_GRACE):
+    """terminate all commands of run_command() which are running (e.g. in checker threads)
+    together with their processes, processes still running after grace seconds are killed"""
+
+    with _running_lock:
+        processes = list(_running_commands)
+    for process in processes:
+        signal_process_group(process, signal.SIGTERM)
+    deadline = time.time() + grace
+    for process in processes:
+        try:
+            process.wait(timeout=max(0.0, deadline - time.time()))
+        except subprocess.TimeoutExpired:
+            pass
+        signal_process_group(process, signal.SIGKILL)
+
+
+class OutputCapture:
+    """drains the output of a process in a background thread while the process is running
+
+    The last max_bytes of the output are kept in memory, once the output exceeds this size
+    it is spilled to a file (filename or a temporary file) which receives the full output.
+    A temporary file is removed by close() unless it is kept by the caller. If a logger is
+    given, the lines are logged as they arrive."""
+
+    def __init__(self, stream, logger=None, max_bytes=MAX_OUTPUT, filename=None):
+        self.stream = stream            # binary stream (e.g. stdout of a process)
+        self.logger = logger            # logger receiving the output (or None)
+        self.max_bytes = max_bytes      # maximum size of the output kept in memory
+        self.filename = filename        # file receiving the full output (or None)
+        self.temporary = False          # filename is a temporary file created by the capture
+        self.file = None
+        self.lines = collections.deque()
+        self.size = 0                   # size of the lines in memory
+        self.dropped = 0                # size of the lines dropped from memory
+        self.thread = threading.Thread(target=self.__drain, name='output')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __drain(self):
+        if self.filename:
+            self.file = open(self.filename, 'wb')
+        for line in iter(self.stream.readline, b''):
+            if self.logger is not None:
+                self.logger.debug('   Out: '+line.decode('utf-8', 'replace').rstrip())
+            self.lines.append(line)
+            self.size += len(line)
+            if self.file is not None:
+                self.file.write(line)
+            if self.size > self.max_bytes:
+                if self.file is None:
+                    # spill everything received so far to a file
+                    if self.filename is None:
+                        fd, self.filename = tempfile.mkstemp(prefix='ts_output_', suffix='.log')
+                        self.file = os.fdopen(fd, 'wb')
+                        self.temporary = True
+                    else:
+                        self.file = open(self.filename, 'wb')
+                    self.file.write(b''.join(self.lines))
+                while self.size > self.max_bytes and len(self.lines) > 1:
+                    line = self.lines.popleft()
+                    self.size -= len(line)
+                    self.dropped += len(line)
+                if self.size > self.max_bytes:
+                    # a single very long line
+                    line = self.lines.popleft()
+                    self.lines.append(line[-self.max_bytes:])
+                    self.size = self.max_bytes
+                    self.dropped += len(line) - self.max_bytes
+
+    def finish(self, timeout=None):
+        """wait until the stream is closed (or the timeout has expired), return False if
+        the stream is still open (e.g. a child of a killed process is still running)"""
+
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            if self.file is not None:
+                self.file.flush()
+            return False
+        if self.file is not None:
+            self.file.close()
+        self.stream.close()
+        return True
+
+    def close(self, keep=False):
+        """remove the temporary file receiving the full output unless keep is True, return
+        the file containing the full output (or None)"""
+
+        if self.temporary and not keep:
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+            self.filename = None
+            self.temporary = False
+        return self.filename
+
+    def output(self):
+        """return the (tail of the) output"""
+
+        text = b''.join(list(self.lines)).decode('utf-8', 'replace')
+        if self.dropped:
+            if self.filename is None:
+                text = '[... {0} bytes omitted]\n'.format(self.dropped) + text
+            else:
+                text = '[... {0} bytes omitted, full output in {1}]\n'.format(self.dropped, self.filename) + text
+        return text
+
+
+def run_command(cmd, logger, timeout=None, cwd=None, env=None, log_output=True, issue_error=True,
+                max_output=MAX_OUTPUT, output_file=None, keep_output=False):
+    """launch a system command and capture its output while it is running, return its
+    exit status (negative if it could not be launched or has been killed), the tail of the
+    output (at most max_output bytes) and the file containing the full output (None if the
+    output has been kept in memory and output_file has not been given)
+
+    A large output is spilled to a temporary file which is removed unless keep_output is
+    True, in this case the caller has to remove it.
+
+    A command given as list of arguments is executed directly, a string is executed by the
+    shell. The command runs in its own session, on timeout all processes it has started are
+    killed. The output is drained concurrently such that a command never blocks on a full pipe."""
 
-    # launch command
-    status = 0
     try:
-        logger.debug('SysCmd: '+cmd)
-        s = subprocess.Popen(cmd,shell=True,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+        logger.debug('SysCmd: '+command_str(cmd))
+        s = subprocess.Popen(cmd,shell=isinstance(cmd, str),stdout=subprocess.PIPE,stderr=subprocess.STDOUT,
+                             cwd=cwd,env=env,start_new_session=True)
     except Exception as e:
         if issue_error:
             logger.error(e)
-            logger.error('Problem with launching system command: '+cmd)
-        status = -1
+            logger.error('Problem with launching system command: '+command_str(cmd))
+        return -1, '', None
+
+    capture = OutputCapture(s.stdout, logger if log_output else None, max_output, output_file)
 
     # wait for command termination
-    if not status:
-        try:
-            if timeout_supported and timeout:
-                s.wait(timeout=int(timeout))
-            else:
-                s.wait()
-        except subprocess.TimeoutExpired:
-            logger.error('Timeout for system command: '+cmd)
-            s.kill()
+    status = 0
+    with _running_lock:
+        _running_commands.add(s)
+    try:
+        if timeout_supported and timeout:
+            s.wait(timeout=int(timeout))
+        else:
             s.wait()
-            status = -2
-        except Exception as e:
-            logger.error(e)
-            logger.error('Problem with waiting for system command: '+cmd)
-            status = -3
-
-    # wait for command termination and log output to logger
-    lines=''
-    if status != -1:
-        while True:
-            line = s.stdout.readline()
-            if not line:
-                break
-            lines += line.decode('ascii')
-            if not return_output:
-                logger.debug('   Out: '+line.rstrip())
+    except subprocess.TimeoutExpired:
+        logger.error('Timeout for system command: '+command_str(cmd))
+        kill_process_group(s)
+        status = -2
+    except Exception as e:
+        logger.error(e)
+        logger.error('Problem with waiting for system command: '+command_str(cmd))
+        status = -3
+    except BaseException:
+        # the testsuite is aborted (e.g. SIGINT), the command must not be left running
+        kill_process_group(s)
+        raise
+    finally:
+        with _running_lock:
+            _running_commands.discard(s)
+
+    # processes started by the command may still hold the output open after a timeout
+    capture.finish(timeout=None if not status else 5)
     if not status:
         status = s.returncode
 
+    path = capture.close(keep_output)
+    if keep_output and capture.temporary:
+        logger.info('Full output of system command in '+path)
+    return status, capture.output(), path
+
+
+def system_command(cmd, logger, throw_exception=True, return_output=False, issue_error=True, timeout=None,
+                   cwd=None, env=None):
+    """wrapper to launch systems commands and handle stdout/stderr and exit status correctly
+
+    The command (a string executed by the shell or a list of arguments) is executed in directory cwd (default is the current working directory)
+    with environment env (default is the environment of the testsuite). The output is
+    streamed while the command is running, only its tail is returned if it is very large
+    (see run_command)."""
+
+    # launch command and wait for command termination, log output to logger
+    status, lines, path = run_command(cmd, logger, timeout=timeout, cwd=cwd, env=env,
+                                      log_output=not return_output, issue_error=issue_error)
+
     # trow exception if requested
     if status: 
         if throw_exception:
-            raise StopError('Error with system command: '+cmd)
+            raise StopError('Error with system command: '+command_str(cmd))
         else:
             if issue_error:
-                logger.error('Error with system command: '+cmd)
+                logger.error('Error with system command: '+command_str(cmd))
 
     if return_output:
         return (status,lines)
@@ -108,6 +287,143 @@ def system_command(cmd, logger, throw_exception=True, return_output=False, issue
         return status
     
 
+# ioctl request to clone a file (reflink) on copy-on-write filesystems (e.g. btrfs, xfs)
+FICLONE = 0x40049409
+
+def _copy_file_data(fsrc, fdst):
+    """copy the data of file fsrc to file fdst with a reflink or an in-kernel copy if
+    supported, return False if the data has to be copied by the caller"""
+
+    if fcntl is not None:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+        except (OSError, IOError):
+            pass
+
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1024*1024*1024) > 0:
+                pass
+            return True
+        except OSError:
+            # not supported (e.g. across filesystems on old kernels), restart from scratch
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+
+    return False
+
+def copy_file(src, dst):
+    """copy a file including its permission bits (dst may be a directory), using a reflink
+    or an in-kernel copy where the filesystem supports it"""
+
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if os.path.islink(dst):
+        os.unlink(dst)
+    with open(src, 'rb') as fsrc:
+        with open(dst, 'wb') as fdst:
+            if not _copy_file_data(fsrc, fdst):
+                shutil.copyfileobj(fsrc, fdst, 1024*1024)
+    shutil.copymode(src, dst)
+
+def copy_tree(src, dst):
+    """copy the content of directory src into directory dst (which may already exist)"""
+
+    for root, dirs, files in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        for name in files:
+            copy_file(os.path.join(root, name), os.path.join(target, name))
+
+def store_file(src, storedir):
+    """place a file into a content-addressed store (once) and return its path in the store"""
+
+    target = os.path.join(storedir, file_hash(src), os.path.basename(src))
+    if not os.path.exists(target):
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmpfile = '%s.tmp.%d.%d' %(target, os.getpid(), threading.get_ident())
+        copy_file(src, tmpfile)
+        os.rename(tmpfile, target)
+    else:
+        # mark the entry as recently used
+        os.utime(os.path.dirname(target))
+    _store_entries.add(os.path.normpath(os.path.dirname(target)))
+    return target
+
+def prune_store(storedir, keep=STORE_KEEP):
+    """remove the entries of a store which have not been used by this invocation, except for the
+    keep most recently used ones, and return the removed entries"""
+
+    try:
+        entries = [os.path.normpath(os.path.join(storedir, name)) for name in os.listdir(storedir)]
+    except OSError:
+        return []
+    unused = [entry for entry in entries if entry not in _store_entries and os.path.isdir(entry)]
+    unused.sort(key=lambda entry: os.path.getmtime(entry), reverse=True)
+    removed = unused[keep:]
+    for entry in removed:
+        shutil.rmtree(entry, ignore_errors=True)
+    return removed
+
+def link_file(src, dst):
+    """hardlink a file to dst, or create a symbolic link if a hardlink is not possible
+    (e.g. across filesystems)"""
+
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        os.symlink(os.path.abspath(src), dst)
+
+def link_tree(src, dst):
+    """link all files of directory src into directory dst (which may already exist)"""
+
+    for root, dirs, files in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        for name in files:
+            link_file(os.path.join(root, name), os.path.join(target, name))
+
+def remove_directory_content(path):
+    """remove all files and directories in a directory (except hidden ones, like rm -r -f *)"""
+
+    for entry in os.scandir(path):
+        if entry.name.startswith('.'):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.unlink(entry.path)
+
+
+# cache of file hashes (filename -> (size, mtime, hash))
+_file_hashes = {}
+
+def file_hash(filename):
+    """return the sha1 hash of the content of a file (cached as long as size and mtime are unchanged)"""
+
+    st = os.stat(filename)
+    cached = _file_hashes.get(filename)
+    if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime:
+        return cached[2]
+
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(1024*1024)
+            if not chunk:
+                break
+            sha.update(chunk)
+    _file_hashes[filename] = (st.st_size, st.st_mtime, sha.hexdigest())
+    return sha.hexdigest()
+
+
 def status_str(status):
     """return status string from status code"""
 
@@ -148,46 +464,55 @@ def pretty_status_str(status,color,bold):
     return COL_ON+status_str(status)+COL_OFF
 
 
-def write_environ(test):
-    """write environment variables for checkers"""
-
-    os.environ['TS_BASEDIR'] = test.basedir
-    os.environ['TS_CONFIG_NL'] = test.conf.config_nl
-    os.environ['TS_NL_TS_SWITCH'] = test.conf.nl_ts_switch
-    os.environ['TS_DT_FILE'] = test.conf.dt_file
-    os.environ['TS_REFOUTDIR'] = test.refoutdir
-    os.environ['TS_VERBOSE'] = str(test.options.v_level)
-    os.environ['TS_RUNDIR'] = test.rundir
-    os.environ['TS_LOGFILE'] = test.log_file
-    os.environ['TS_NAMELISTDIR'] = test.namelistdir
-    os.environ['TS_TOLERANCE'] = test.tolerance
-    os.environ['TS_FORCEMATCH'] = str(test.forcematch)
-    os.environ['TS_TUNING_ITERATIONS'] = str(test.options.tuning_iterations)
-    os.environ['TS_TUNE_THRESHOLDS'] = str(test.options.tune_thresholds)
-    os.environ['TS_RESET_THRESHOLDS'] = str(test.options.reset_thresholds)
-    os.environ['TS_ICON'] = str(test.options.icon)
-    os.environ['TS_YUFILE'] = test.conf.yufile
-
-def read_environ():
-    """read environment variables and store into local map"""
+def checker_environ(test):
+    """return environment variables for checkers of a test (without modifying os.environ)"""
+
+    environ = {}
+    environ['TS_BASEDIR'] = test.basedir
+    environ['TS_CONFIG_NL'] = test.conf.config_nl
+    environ['TS_NL_TS_SWITCH'] = test.conf.nl_ts_switch
+    environ['TS_DT_FILE'] = test.conf.dt_file
+    environ['TS_REFOUTDIR'] = test.refoutdir
+    environ['TS_VERBOSE'] = str(test.options.v_level)
+    environ['TS_RUNDIR'] = test.rundir
+    environ['TS_LOGFILE'] = test.log_file
+    environ['TS_NAMELISTDIR'] = test.namelistdir
+    environ['TS_TOLERANCE'] = test.tolerance
+    environ['TS_FORCEMATCH'] = str(test.forcematch)
+    environ['TS_TUNING_ITERATIONS'] = str(test.options.tuning_iterations)
+    environ['TS_TUNE_THRESHOLDS'] = str(test.options.tune_thresholds)
+    environ['TS_RESET_THRESHOLDS'] = str(test.options.reset_thresholds)
+    environ['TS_ICON'] = str(test.options.icon)
+    environ['TS_YUFILE'] = test.conf.yufile
+    if test.options.yu_cache:
+        environ['TS_YUCACHE'] = os.path.join(test.options.workdir, test.options.yu_cache)
+    else:
+        environ['TS_YUCACHE'] = ''
+    return environ
+
+def read_environ(context=None):
+    """read environment variables (or the context passed to an in-process checker) and store into local map"""
 
+    if context is None:
+        context = os.environ
     environ = {}
-    environ['BASEDIR'] = os.environ['TS_BASEDIR']
-    environ['CONFIG_NL'] = os.environ['TS_CONFIG_NL']
-    environ['NL_TS_SWITCH'] = os.environ['TS_NL_TS_SWITCH']
-    environ['DT_FILE'] = os.environ['TS_DT_FILE']
-    environ['REFOUTDIR'] = os.environ['TS_REFOUTDIR']
-    environ['VERBOSE'] = os.environ['TS_VERBOSE']
-    environ['RUNDIR'] = os.environ['TS_RUNDIR']
-    environ['LOGFILE'] = os.environ['TS_LOGFILE']
-    environ['NAMELISTDIR'] = os.environ['TS_NAMELISTDIR']
-    environ['TOLERANCE'] = os.environ['TS_TOLERANCE']
-    environ['FORCEMATCH'] = os.environ['TS_FORCEMATCH']
-    environ['TUNING_ITERATIONS'] = os.environ['TS_TUNING_ITERATIONS']
-    environ['TUNE_THRESHOLDS'] = os.environ['TS_TUNE_THRESHOLDS']
-    environ['RESET_THRESHOLDS'] = os.environ['TS_RESET_THRESHOLDS']
-    environ['ICON'] = os.environ['TS_ICON']
-    environ['YUFILE'] = os.environ['TS_YUFILE']
+    environ['BASEDIR'] = context['TS_BASEDIR']
+    environ['CONFIG_NL'] = context['TS_CONFIG_NL']
+    environ['NL_TS_SWITCH'] = context['TS_NL_TS_SWITCH']
+    environ['DT_FILE'] = context['TS_DT_FILE']
+    environ['REFOUTDIR'] = context['TS_REFOUTDIR']
+    environ['VERBOSE'] = context['TS_VERBOSE']
+    environ['RUNDIR'] = context['TS_RUNDIR']
+    environ['LOGFILE'] = context['TS_LOGFILE']
+    environ['NAMELISTDIR'] = context['TS_NAMELISTDIR']
+    environ['TOLERANCE'] = context['TS_TOLERANCE']
+    environ['FORCEMATCH'] = context['TS_FORCEMATCH']
+    environ['TUNING_ITERATIONS'] = context['TS_TUNING_ITERATIONS']
+    environ['TUNE_THRESHOLDS'] = context['TS_TUNE_THRESHOLDS']
+    environ['RESET_THRESHOLDS'] = context['TS_RESET_THRESHOLDS']
+    environ['ICON'] = context['TS_ICON']
+    environ['YUFILE'] = context['TS_YUFILE']
+    environ['YUCACHE'] = context.get('TS_YUCACHE', '')
     return environ
 
 def str_to_bool(str):
@@ -6,6 +6,18 @@ COSMO TECHNICAL TESTSUITE
 Python class to wrap around YUPRTEST files and allow the owner
 to use it as an iterator in order to read the data line-by-line
 
+The comparison of two files is done on columns (NumPy arrays) of all
+records of the common timesteps at once. The records of both files are
+matched by (var, step, level). Records of the reference which are missing
+make their timestep fail, additional records are only reported.
+
+If a cache directory is given, the columns of a file are stored in a binary
+file (.npz) whose name is derived from the path, size and modification time
+of the YUPRTEST file, and loaded from there as long as the file is unchanged
+(e.g. the reference of several tests or of all tuning iterations).
+
+c = Compare('YUPRTEST', 'YUPRTEST.ref', 'THRESHOLDS', cachedir='work/ts_yucache')
+
 c = Compare('YUPRTEST.ref', 'YUPRTEST.ref', 'THRESHOLDS')
 c.compare_data()
 c.thresholds.mode = "const"
@@ -16,9 +28,10 @@ c.print_results()
 """
 
 # built-in modules
-import os
+import os, glob, time, hashlib, threading
 
 # other modules
+import numpy as np
 from ts_thresholds import Thresholds
 
 # information
@@ -30,24 +43,100 @@ __maintainer__  = "oliver.fuhrer@meteoswiss.ch"
 myname = os.path.basename(__file__)
 header = myname + ': '
 
+# version of the format of the cache files (increase to invalidate existing files)
+CACHE_VERSION = '1'
+
+# files modified less than RACY_NS ago are not cached (the modification time may not
+# change if they are written again)
+RACY_NS = 2000000000
+
 
 def column(matrix, i):
     """return a specific column from a list of lists (matrix)"""
     return [row[i] for row in matrix]
 
 
+def _factorize(*columns):
+    """return the distinct combinations of values of a set of columns and for each row
+    the index of its combination"""
+    codes = []
+    uniques = []
+    for c in columns:
+        u, code = np.unique(c, return_inverse=True)
+        uniques.append(u)
+        codes.append(code.reshape(-1))
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    for u, code in zip(uniques, codes):
+        key = key * len(u) + code
+    keys, group = np.unique(key, return_inverse=True)
+    combinations = []
+    for k in keys:
+        combination = []
+        for u in reversed(uniques):
+            combination.insert(0, u[k % len(u)].item())
+            k //= len(u)
+        combinations.append(tuple(combination))
+    return combinations, group.reshape(-1)
+
+
+def _occurrences(group):
+    """return for each row the number of preceding rows of the same group"""
+    order = np.argsort(group, kind='stable')
+    index = np.arange(len(group))
+    # index of the first row of each group in the sorted order
+    first = np.r_[True, group[order][1:] != group[order][:-1]][:len(group)]
+    start = np.maximum.accumulate(np.where(first, index, 0))
+    rank = np.empty(len(group), dtype=np.int64)
+    rank[order] = index - start
+    return rank
+
+
+def match_records(keys1, keys2):
+    """return the indices of the rows of two sets of key columns (e.g. var, step, level)
+    which have the same key, in the order of the rows of the first set (the n-th occurrence
+    of a key in the first set is matched with the n-th occurrence in the second set)"""
+    n1 = len(keys1[0])
+    combinations, group = _factorize(*[np.r_[a, b] for a, b in zip(keys1, keys2)])
+    size = len(group) + 1
+    key1 = group[:n1] * size + _occurrences(group[:n1])
+    key2 = group[n1:] * size + _occurrences(group[n1:])
+    common, index1, index2 = np.intersect1d(key1, key2, assume_unique=True, return_indices=True)
+    order = np.argsort(index1, kind='stable')
+    return index1[order], index2[order]
+
+
+def _format_keys(keys, maxkeys=5):
+    """return a description of a list of keys (var, step, level) of records"""
+    text = ['%s %d %d' % key for key in keys[:maxkeys]]
+    if len(keys) > maxkeys:
+        text.append('...')
+    return ', '.join(text)
+
+
+def _first_order(group, rank):
+    """return the groups ordered by the smallest rank of their rows"""
+    first = np.full(group.max() + 1, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, group, rank)
+    return np.argsort(first, kind='stable')
+
+
 class Yuprtest(object):
     """class to wrap around a YUPRTEST file"""
 
 
-    def __init__(self, filename):
+    def __init__(self, filename, cachedir=None):
         self._filename = filename  # name of associated YUPRTEST file
         self._file = None  # file handle
-        self._raw = []  # raw data
-        self._data = []  # processed data
+        self._records = None  # processed data (see _data)
+        self._columns = None  # processed data as arrays (see columns())
         self._headerlines = 0  # number of header lines
         self._lineno = 0  # current line number (for iterator)
-        self.__read_data()
+        cachefile = self.__cache_file(cachedir)
+        if cachefile is None or not self.__load_cache(cachefile):
+            self._records = []
+            self.__read_data()
+            if cachefile is not None:
+                self.__store_cache(cachefile)
 
     def __iter__(self):
         return self
@@ -62,13 +151,66 @@ class Yuprtest(object):
             data = self.__parse_line(line, lineno)
             if data:
                 header = False
-                self._raw.append(line.strip())
-                self._data.append(data)
+                self._records.append(data)
             else:
                 if not header:
                     raise IOError('Parse error on line ' + str(lineno))
         self._file.close()
 
+    def __cache_file(self, cachedir):
+        """return the name of the cache file of the current content of the YUPRTEST file,
+        or None if it is not cached"""
+        if not cachedir:
+            return None
+        st = os.stat(self._filename)
+        if time.time() * 1e9 - st.st_mtime_ns < RACY_NS:
+            return None
+        path = hashlib.sha1(os.path.abspath(self._filename).encode()).hexdigest()
+        return os.path.join(cachedir, '%s-%d-%d-%s.npz' % (path, st.st_size, st.st_mtime_ns, CACHE_VERSION))
+
+    def __load_cache(self, cachefile):
+        """load the columns from a cache file, return False if there is none (a damaged
+        cache file, e.g. truncated, is removed)"""
+        if not os.path.exists(cachefile):
+            return False
+        try:
+            with np.load(cachefile) as f:
+                self._columns = (f['var'], f['step'], f['level'], f['values'])
+                self._headerlines = int(f['headerlines'])
+        except Exception:
+            self._columns = None
+            self._headerlines = 0
+            try:
+                os.remove(cachefile)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def __store_cache(self, cachefile):
+        """write the columns to a cache file and remove the files of older versions"""
+        cachedir = os.path.dirname(cachefile)
+        prefix = os.path.basename(cachefile).split('-')[0]
+        var, step, level, values = self.columns()
+        tmpfile = '%s.tmp.%d.%d' % (cachefile, os.getpid(), threading.get_ident())
+        try:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir, exist_ok=True)
+            with open(tmpfile, 'wb') as f:
+                np.savez(f, var=var, step=step, level=level, values=values,
+                         headerlines=self._headerlines)
+            os.replace(tmpfile, cachefile)
+            for path in glob.glob(os.path.join(cachedir, prefix + '-*.npz')):
+                if path != cachefile:
+                    os.remove(path)
+        except (IOError, OSError):
+            # the cache is optional
+            if os.path.exists(tmpfile):
+                try:
+                    os.remove(tmpfile)
+                except OSError:
+                    pass
+
     def __parse_line(self, line, lineno):
         data = line.strip().split()
         if (len(data) == 0):  # check for zero length lines
@@ -112,15 +254,24 @@ class Yuprtest(object):
 
     @property
     def variables(self):
-        return sorted(list(set(column(self._data, 0))))
+        return np.unique(self.columns()[0]).tolist()
 
     @property
     def steps(self):
-        return sorted(list(set(column(self._data, 1))))
+        return np.unique(self.columns()[1]).tolist()
 
     @property
     def levels(self):
-        return sorted(list(set(column(self._data, 2))))
+        return np.unique(self.columns()[2]).tolist()
+
+    @property
+    def _data(self):
+        """records as lists of var, step, level, minval, maxval, meanval"""
+        if self._records is None:
+            var, step, level, values = self._columns
+            self._records = [[v, n, l] + x for v, n, l, x in
+                             zip(var.tolist(), step.tolist(), level.tolist(), values.tolist())]
+        return self._records
 
     @property
     def data(self):
@@ -140,6 +291,20 @@ class Yuprtest(object):
         for i in self._data:
             yield i
 
+    def columns(self, steps=None):
+        """return the records (of a set of steps) as arrays of var, step, level
+        and the values (minval, maxval, meanval) with one row per record"""
+        if self._columns is None:
+            self._columns = (np.array(column(self._data, 0), dtype=str),
+                             np.array(column(self._data, 1), dtype=np.int64),
+                             np.array(column(self._data, 2), dtype=np.int64),
+                             np.stack([np.array(column(self._data, i), dtype=np.float64)
+                                       for i in [3, 4, 5]], axis=-1).reshape(-1, 3))
+        if steps is None:
+            return self._columns
+        mask = np.isin(self._columns[1], list(steps))
+        return tuple([c[mask] for c in self._columns])
+
     def getSubline(self, subSetSteps):
         # extract subset of lines
         subData = filter(lambda r: r[1] in subSetSteps, self._data)
@@ -191,12 +356,14 @@ class Compare(object):
     """class to compare two YUPRTEST files using a thresholds object"""
 
 
-    def __init__(self, filename1, filename2, thresh):
+    def __init__(self, filename1, filename2, thresh, cachedir=None):
         self._filename1 = filename1
         self._filename2 = filename2
         self._yu1 = Yuprtest(filename1)
-        self._yu2 = Yuprtest(filename2)
+        self._yu2 = Yuprtest(filename2, cachedir)  # reference
         self._threshold = Thresholds(thresh)
+        self._missing = []  # keys of records of the reference not found in filename1
+        self._extra = []  # keys of records of filename1 not found in the reference
 
     @property
     def thresholds(self):
@@ -244,29 +411,61 @@ class Compare(object):
         pos = ["minimum", "maximum", "mean"][[diff1, diff2, diff3].index(min([diff1, diff2, diff3]))]
         return YuprLine(status, diff, var, step, level, thresh, pos)
 
-    def __update_status(self, yupr_line):
-        rel = yupr_line.diff
-        if yupr_line.thresh > 0.0:
-            rel = yupr_line.diff / yupr_line.thresh
-        step = str(yupr_line.step)
-        var = yupr_line.var
-
-        # update status for this timestep
-        if not step in self._status.keys():
-            self._status[step] = yupr_line.status
-        self._status[step] = max(self._status[step], yupr_line.status)
-        # update maxdiff for this timestep and variable
-        if not step in self._maxdiff.keys():
-            self._maxdiff[step] = {}
-        if not var in self._threshold.variables:
-            var = [yupr_line.var, "*"]
-        else:
-            var = [yupr_line.var]
-        for x in var:
-            if not x in self._maxdiff[step].keys():
-                self._maxdiff[step][x] = [0, -float('Inf'), -float('Inf')]
-            if yupr_line.status >= self._maxdiff[step][x][0] and rel > self._maxdiff[step][x][1]:
-                self._maxdiff[step][x] = [yupr_line.status, rel, yupr_line.diff, yupr_line.level, yupr_line.thresh, yupr_line.pos]
+    def __compute_differences(self, ref, values):
+        """calculate the differences of arrays of values like __compute_difference"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self._threshold.minval < 0.0:
+                return np.abs(values - ref)  # absolute difference
+            return np.where(np.abs(ref) > self._threshold.minval,
+                            np.abs((values - ref) / ref), 0.0)  # relative difference
+
+    def __get_thresholds(self, var, step):
+        """return the threshold of each record (computed once per variable and step)"""
+        pairs, group = _factorize(var, step)
+        thresh = [self._threshold.get_threshold(str(v), int(n)) for v, n in pairs]
+        return np.array(thresh, dtype=np.float64)[group]
+
+    @staticmethod
+    def __select_records(group, status, rel):
+        """return for each group the index of the record with the largest difference relative to
+        the threshold, i.e. the last record for which status >= status of the currently selected
+        record and rel > rel of the currently selected record when walking through the records
+        in their order (-1 if no record is selected)"""
+        ngroups = group.max() + 1
+        order = np.argsort(group, kind='stable')
+        sgroup = group[order]
+        starts = np.flatnonzero(np.r_[True, sgroup[1:] != sgroup[:-1]])
+        ends = np.r_[starts[1:], len(group)]
+
+        # if status and rel are ordered consistently within a group (a higher status always
+        # has a larger rel), the walk selects the first record with the largest rel
+        nan = np.isnan(rel)
+        consistent = np.bincount(group, weights=nan, minlength=ngroups) == 0
+        for s in [0, 1]:
+            low = (status <= s) & ~nan
+            high = (status > s) & ~nan
+            maxlow = np.full(ngroups, -np.inf)
+            np.maximum.at(maxlow, group[low], rel[low])
+            minhigh = np.full(ngroups, np.inf)
+            np.minimum.at(minhigh, group[high], rel[high])
+            consistent &= maxlow < minhigh
+
+        selected = np.full(ngroups, -1, dtype=np.int64)
+        srel = rel[order]
+        gmax = np.maximum.reduceat(srel, starts)
+        pos = np.flatnonzero(srel == gmax[sgroup])
+        groups, first = np.unique(sgroup[pos], return_index=True)
+        selected[groups] = order[pos[first]]
+        selected[gmax == -np.inf] = -1
+
+        # otherwise (e.g. NaNs or thresholds of different variables) walk through the records
+        for g in np.flatnonzero(~consistent):
+            best, best_status, best_rel = -1, 0, -float('Inf')
+            for i in order[starts[g]:ends[g]]:
+                if status[i] >= best_status and rel[i] > best_rel:
+                    best, best_status, best_rel = i, status[i], rel[i]
+            selected[g] = best
+        return selected
 
     def print_results(self):
         """print results"""
@@ -290,10 +489,80 @@ class Compare(object):
                 if 'mmax' in locals() and mmax[0] > 1:
                     reason = str(mmax[5]) + ' of ' + str(mmax[-1]) + ' on level ' + str(mmax[3]) \
                             + ' (%9.2e' % mmax[2] + ' > ' + str(mmax[4]) + ')'
+                else:
+                    missing = [key for key in self._missing if str(key[1]) == step]
+                    if missing:
+                        reason = 'records missing (' + _format_keys(missing, 1) + ')'
             print('%5d  %s  %7s  %s' % (int(step), '  '.join(['%9.2e' % x for x in vals]), stat, reason))
 
+    def __compare_records(self, var, step, level, ref, values):
+        """compare the columns of the records of both files and store the status of each
+        timestep and the maximum difference of each timestep and variable"""
+        n = len(step)
+
+        # differences of minimum, maximum and mean and their status
+        diffs = self.__compute_differences(ref, values)
+        thresh = self.__get_thresholds(var, step)
+        status = np.where(diffs == 0.0, 0, np.where(diffs <= thresh[:, None], 1, 2)).max(axis=1)
+        diff = diffs[:, 0]
+        dmin = diffs[:, 0]
+        imin = np.zeros(n, dtype=np.int64)
+        for k in [1, 2]:
+            # same results as max() and min() of a list (also with NaNs)
+            diff = np.where(diffs[:, k] > diff, diffs[:, k], diff)
+            less = diffs[:, k] < dmin
+            dmin = np.where(less, diffs[:, k], dmin)
+            imin = np.where(less, k, imin)
+        pos = np.array(["minimum", "maximum", "mean"])[imin]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel = np.where(thresh > 0.0, diff / thresh, diff)
+
+        # status of each timestep (steps in the order of their first record)
+        steps, group = _factorize(step)
+        smax = np.zeros(len(steps), dtype=np.int64)
+        np.maximum.at(smax, group, status)
+        for i in _first_order(group, np.arange(n)):
+            self._status[str(steps[i][0])] = int(smax[i])
+            self._maxdiff[str(steps[i][0])] = {}
+
+        # maximum difference of each timestep and variable, variables without specific
+        # thresholds are also accounted for in "*"
+        other = np.flatnonzero(~np.isin(var, self._threshold.variables))
+        record = np.r_[np.arange(n), other]
+        keys, group = _factorize(step[record], np.r_[var, np.full(len(other), "*")])
+        selected = self.__select_records(group, status[record], rel[record])
+        for i in _first_order(group, 2*record + np.r_[np.zeros(n, dtype=np.int64), np.ones(len(other), dtype=np.int64)]):
+            j = selected[i]
+            if j < 0:
+                entry = [0, -float('Inf'), -float('Inf')]
+            else:
+                j = record[j]
+                entry = [int(status[j]), float(rel[j]), float(diff[j]), int(level[j]), float(thresh[j]), str(pos[j])]
+            self._maxdiff[str(keys[i][0])][str(keys[i][1])] = entry
+
+    def __match(self, steps=None):
+        """return the columns of the records (of a set of steps) of both files matched by
+        (var, step, level), records found in only one of the files are reported and stored
+        in _extra (records of the first file) and _missing (records of the reference)"""
+        var, step, level, ref = self._yu1.columns(steps)
+        var2, step2, level2, values = self._yu2.columns(steps)
+        index1, index2 = match_records((var, step, level), (var2, step2, level2))
+        extra = np.setdiff1d(np.arange(len(step)), index1)
+        missing = np.setdiff1d(np.arange(len(step2)), index2)
+        self._extra = list(zip(var[extra].tolist(), step[extra].tolist(), level[extra].tolist()))
+        self._missing = list(zip(var2[missing].tolist(), step2[missing].tolist(), level2[missing].tolist()))
+        if self._missing:
+            print("WARNING: {n} records of {f2} not found in {f1} (var nt lev): {keys}".format(
+                n=len(self._missing), f1=self._filename1, f2=self._filename2,
+                keys=_format_keys(self._missing)))
+        if self._extra:
+            print("WARNING: {n} records of {f1} not found in {f2} (var nt lev): {keys}".format(
+                n=len(self._extra), f1=self._filename1, f2=self._filename2,
+                keys=_format_keys(self._extra)))
+        return var[index1], step[index1], level[index1], ref[index1], values[index2]
+
     def compare_data(self):
-        """compare two yu files line by line and return the highest error"""
+        """compare two yu files record by record and return the highest error"""
         self._mode = "compare"
         self._lineno = 0
         self._maxdiff = {}
@@ -301,11 +570,20 @@ class Compare(object):
         steps1 = set(self._yu1.steps)
         steps2 = set(self._yu2.steps)
         commonSteps = steps1 & steps2
-        # Only compare common time steps
-        for x, y in zip(self._yu1.getSubline(commonSteps), self._yu2.getSubline(commonSteps)):
-            yupr_line = self.__compare_entry(x, y)
-            self.__update_status(yupr_line)
-            self._lineno += 1
+        # Only compare common time steps, records are compared in the order of the first file
+        var, step, level, ref, values = self.__match(commonSteps)
+        self._lineno = len(step)
+        if len(step) > 0:
+            self.__compare_records(var, step, level, ref, values)
+        # common time steps without any matching records
+        for n in sorted(commonSteps):
+            if str(n) not in self._status:
+                self._status[str(n)] = 0
+                self._maxdiff[str(n)] = {}
+        # records of the reference which are missing in the first file make their time step
+        # fail, additional records of the first file are only reported
+        for key in self._missing:
+            self._status[str(key[1])] = 2
 
         stat = max(self._status.values())
         # fix thresholds variables which were not encountered
@@ -329,10 +607,12 @@ class Compare(object):
         # Note: The effect update is done in the __compare_values 
         self._mode = "update"
         self._lineno = 0
-        for x, y in zip(self._yu1.getline(), self._yu2.getline()):
+        var, step, level, ref, values = self.__match()
+        for x, y in zip(zip(var.tolist(), step.tolist(), level.tolist(), *ref.T.tolist()),
+                        zip(var.tolist(), step.tolist(), level.tolist(), *values.T.tolist())):
             self.__compare_entry(x, y)
             self._lineno += 1
-        
+
         # Set the default threshold to the maximum of all the variables
         self._threshold.update_default_thresholds()
         